@@ -1,18 +1,23 @@
 import streamlit as st
+import io
 import os
+import shutil
 import tempfile
+import threading
 import time
-from difflib import SequenceMatcher
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from openpyxl import Workbook
 
 # Import your existing modules
 import config
 from extractor import extract_chunks_from_two_pdfs
-from parser import parse_with_llm_openai
+from parser import parse_with_llm_openai, prepare_openai_batch, run_openai_batch, collect_openai_batch
 from writer import write_to_excel
-from table_extractor import write_temp_merged_pdf, call_whisperer_and_get_text
+from table_extractor import build_merged_pdf_bytes, call_whisperer_and_get_text
 from table_parser import parser_for_table
 from table_writer import writer_to_excel_table
+from pairing import match_pairs
 
 # --- Page Config ---
 st.set_page_config(page_title="SPO Framework Extractor", layout="wide")
@@ -30,82 +35,210 @@ with st.sidebar:
     st.divider()
     
     openai_model = st.selectbox("OpenAI Model", ["gpt-4o", "gpt-4o-mini", "gpt-4-turbo"], index=1)
+
+    use_batch_api = st.checkbox(
+        "Async batch mode (OpenAI Batch API)",
+        value=False,
+        help="Send the text prompts of all pairs as one OpenAI batch job. About half the cost, but results can take minutes to hours."
+    )
     
-    # Update Config globals
-    config.OPENAI_MODEL = openai_model
+    # Export API keys for the pipeline modules (the model is passed explicitly)
     if openai_api_key:
         os.environ["OPENAI_API_KEY"] = openai_api_key
     if whisperer_api_key:
         os.environ["LLMWHISPERER_API_KEY"] = whisperer_api_key
 
-# --- Helper: Smart Pairing ---
-def match_pairs(file_list):
+# --- Helper: Temp Files ---
+def save_upload(uploaded_file, path):
     """
-    Groups uploaded files into (Framework, SPO) pairs based on filename similarity.
-    Returns: 
-        pairs: List of dicts {'framework': file, 'spo': file, 'name': str}
-        unmatched: List of files that couldn't be paired
+    Streams an uploaded file to disk in 1 MB blocks instead of materializing it.
+    Does nothing if this upload was already saved earlier in the batch; `path`
+    must be unique per upload (see `upload_path`).
     """
-    frameworks = []
-    spos = []
-    others = []
-
-    # 1. Bucket files
-    for f in file_list:
-        fname = f.name.lower()
-        if "framework" in fname and not any(x in fname for x in ["spo", "second", "opinion"]):
-            frameworks.append(f)
-        elif any(x in fname for x in ["spo", "second", "opinion"]):
-            spos.append(f)
-        else:
-            others.append(f)
-
-    pairs = []
-    used_spos = set()
-
-    # 2. Match Frameworks to nearest SPO
-    for fw in frameworks:
-        best_match = None
-        best_score = 0.0
-        fw_name = fw.name.lower()
-
-        for spo in spos:
-            if spo in used_spos:
-                continue
-            
-            # Simple similarity ratio
-            score = SequenceMatcher(None, fw_name, spo.name.lower()).ratio()
-            
-            # Boost score if they share a prefix (e.g. "Tesla_Framework" vs "Tesla_SPO")
-            common_prefix_len = 0
-            for c1, c2 in zip(fw_name, spo.name.lower()):
-                if c1 == c2: common_prefix_len += 1
-                else: break
-            
-            if common_prefix_len > 3:
-                score += 0.5
-
-            if score > best_score:
-                best_score = score
-                best_match = spo
-
-        if best_match and best_score > 0.4:  # Threshold to avoid bad matches
-            used_spos.add(best_match)
-            # Create a display name based on the common prefix
-            pairs.append({
-                "name": os.path.commonprefix([fw.name, best_match.name]).strip("-_ "),
-                "framework": fw,
-                "spo": best_match
-            })
-        else:
-            others.append(fw)
+    # Exclusive create: one syscall instead of an exists() check followed by open()
+    try:
+        out = path.open("xb")
+    except FileExistsError:
+        return
+    with out:
+        uploaded_file.seek(0)
+        shutil.copyfileobj(uploaded_file, out, length=1 << 20)
+
+def upload_path(uploaded_file, temp_dir):
+    """
+    Temp path for an upload. Each upload gets its own subdirectory, so two
+    uploads sharing a filename never shadow each other in the shared temp dir.
+    """
+    folder = Path(temp_dir) / str(getattr(uploaded_file, "file_id", id(uploaded_file)))
+    folder.mkdir(exist_ok=True)
+    return folder / uploaded_file.name
+
+def save_pair_files(p, temp_dir):
+    """
+    Saves the pair's uploaded PDFs into temp_dir (once) and returns their paths.
+    """
+    fw_file = p['framework']
+    spo_file = p['spo']
+
+    fw_path = upload_path(fw_file, temp_dir)
+    spo_path = upload_path(spo_file, temp_dir)
+
+    jobs = [(fw_file, fw_path), (spo_file, spo_path)]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(lambda job: save_upload(*job), jobs))
+
+    return fw_path, spo_path
+
+# --- Helper: OpenAI Batch API ---
+MIN_BATCH_REQUESTS = 5  # Below this, synchronous calls finish sooner than a batch job
+
+def run_text_batch(pairs, temp_dir, openai_model):
+    """
+    Runs the textual LLM step of every pair as a single OpenAI batch job.
+
+    Returns:
+        Dict[int, list | Exception]: parsed results (or the error) per pair index.
+        Empty when there are too few prompts for a batch job, in which case the
+        pairs fall back to synchronous calls.
+    """
+    prepared = {}
+    text_results = {}
+
+    for idx, p in enumerate(pairs):
+        pair_name = p['name'] or f"Pair {idx+1}"
+        try:
+            fw_path, spo_path = save_pair_files(p, temp_dir)
+            chunks = extract_chunks_from_two_pdfs(
+                fw_path, spo_path,
+                chunk_size=config.CHUNK_SIZE,
+                overlap=config.OVERLAP,
+                folder_name=pair_name
+            )
+            prepared[idx] = prepare_openai_batch(
+                chunks,
+                config.PROMPTS_FILE,
+                openai_model=openai_model,
+                top_k=config.TOP_K,
+                key_prefix=str(idx)
+            )
+        except Exception as e:
+            text_results[idx] = e
+
+    requests = [r for reqs in prepared.values() for r in reqs]
+    if len(requests) < MIN_BATCH_REQUESTS:
+        return {}
+
+    try:
+        contents = run_openai_batch(requests)
+    except Exception as e:
+        return {idx: e for idx in range(len(pairs))}
+
+    for idx, reqs in prepared.items():
+        try:
+            text_results[idx] = collect_openai_batch(reqs, contents)
+        except Exception as e:
+            text_results[idx] = e
+
+    return text_results
+
+# --- Helper: Per-pair Pipeline ---
+def run_text_phase(fw_path, spo_path, pair_name, openai_model):
+    """
+    PHASE 1: extracts text chunks from the pair and parses them with OpenAI.
+    """
+    chunks = extract_chunks_from_two_pdfs(
+        fw_path, spo_path,
+        chunk_size=config.CHUNK_SIZE,
+        overlap=config.OVERLAP,
+        folder_name=pair_name
+    )
 
-    # Add remaining unmatched SPOs to others
-    for spo in spos:
-        if spo not in used_spos:
-            others.append(spo)
+    return parse_with_llm_openai(
+        chunks,
+        config.PROMPTS_FILE,
+        openai_model=openai_model,
+        top_k=config.TOP_K
+    )
 
-    return pairs, others
+def run_table_phase(fw_path, spo_path, openai_model):
+    """
+    PHASE 2: merges the table pages, sends them to LLMWhisperer and parses the tables.
+    Returns None when neither PDF contains a table.
+    """
+    merged_pdf = build_merged_pdf_bytes(fw_path, spo_path)
+    if not merged_pdf:
+        return None
+
+    extracted_text = call_whisperer_and_get_text(merged_pdf)
+    return parser_for_table(extracted_text, config.PROMPTS_TABLE, openai_model=openai_model)
+
+def process_pair(p, idx, temp_dir, workbook, excel_lock, openai_model, text_results=None):
+    """
+    Runs the textual and table pipelines for a single (Framework, SPO) pair.
+    The two phases are independent and mostly wait on the network, so they
+    run side by side.
+
+    Called from a worker thread, so it must not touch Streamlit elements;
+    errors are returned to the caller instead of being displayed here.
+    Both writes into the shared `workbook` happen under `excel_lock` in one go,
+    since openpyxl is not thread-safe and the text and table sheets must assign
+    Framework IDs in the same order.
+
+    `text_results` holds the pair's entry from `run_text_batch` when the text
+    prompts were already answered through the OpenAI Batch API.
+
+    Returns:
+        (pair_name, text_err, table_err)
+    """
+    pair_name = p['name'] or f"Pair {idx+1}"
+    text_err = None
+    table_err = None
+
+    # Save files to temp
+    fw_path, spo_path = save_pair_files(p, temp_dir)
+
+    # --- PHASE 1 & 2: Textual and Table Pipelines ---
+    text_future = None
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        if text_results is None:
+            text_future = executor.submit(run_text_phase, fw_path, spo_path, pair_name, openai_model)
+        table_future = executor.submit(run_table_phase, fw_path, spo_path, openai_model)
+
+    results = []
+    if isinstance(text_results, Exception):
+        text_err = text_results
+    elif text_results is not None:
+        results = text_results
+    else:
+        try:
+            results = text_future.result()
+        except Exception as e:
+            text_err = e
+
+    parsed_dict = None
+    try:
+        parsed_dict = table_future.result()
+    except Exception as e:
+        table_err = e
+
+    # --- Write both phases to Excel ---
+    with excel_lock:
+        try:
+            for r in results:
+                run_for = r.get("run_for")
+                json_result = r.get("result", {})
+                if run_for and isinstance(json_result, dict):
+                    write_to_excel(json_result, run_for=run_for, workbook=workbook)
+        except Exception as e:
+            text_err = e
+
+        try:
+            if parsed_dict is not None:
+                writer_to_excel_table(parsed_dict, workbook=workbook)
+        except Exception as e:
+            table_err = e
+
+    return pair_name, text_err, table_err
 
 # --- Main UI ---
 uploaded_files = st.file_uploader(
@@ -137,77 +270,60 @@ if uploaded_files:
         else:
             # Create a temporary directory for the whole batch
             with tempfile.TemporaryDirectory() as temp_dir:
-                excel_output_path = os.path.join(temp_dir, "SPO_Batch_Output.xlsx")
-                config.EXCEL_FILE = excel_output_path
+                # One workbook for the whole batch; the writers add their sheets on first use
+                workbook = Workbook()
+                workbook.remove(workbook.active)
                 
                 # Progress bar for the whole batch
                 main_progress = st.progress(0)
                 status_text = st.empty()
 
-                for idx, p in enumerate(pairs):
-                    pair_name = p['name'] or f"Pair {idx+1}"
-                    status_text.markdown(f"### Processing: **{pair_name}** ({idx+1}/{len(pairs)})")
-                    
-                    fw_file = p['framework']
-                    spo_file = p['spo']
-                    
-                    # Save files to temp
-                    fw_path = os.path.join(temp_dir, fw_file.name)
-                    spo_path = os.path.join(temp_dir, spo_file.name)
-                    
-                    with open(fw_path, "wb") as f: f.write(fw_file.getbuffer())
-                    with open(spo_path, "wb") as f: f.write(spo_file.getbuffer())
-
-                    # --- PHASE 1: Textual Pipeline ---
-                    try:
-                        chunks = extract_chunks_from_two_pdfs(
-                            fw_path, spo_path, 
-                            chunk_size=config.CHUNK_SIZE, 
-                            overlap=config.OVERLAP, 
-                            folder_name=pair_name
-                        )
-                        
-                        results = parse_with_llm_openai(
-                            chunks, 
-                            config.PROMPTS_FILE, 
-                            openai_model=config.OPENAI_MODEL, 
-                            top_k=config.TOP_K
+                text_results = {}
+                if use_batch_api:
+                    status_text.markdown("### Waiting for the OpenAI batch job...")
+                    text_results = run_text_batch(pairs, temp_dir, openai_model)
+
+                status_text.markdown(f"### Processing {len(pairs)} pair(s)...")
+
+                # Pairs are dominated by network waits (OpenAI, LLMWhisperer),
+                # so run them concurrently and report as each one finishes.
+                excel_lock = threading.Lock()
+                completed = 0
+
+                with ThreadPoolExecutor(max_workers=min(8, len(pairs))) as executor:
+                    futures = [
+                        executor.submit(
+                            process_pair, p, idx, temp_dir, workbook, excel_lock,
+                            openai_model, text_results.get(idx)
                         )
-                        
-                        for r in results:
-                            run_for = r.get("run_for")
-                            json_result = r.get("result", {})
-                            if run_for and isinstance(json_result, dict):
-                                # Pass file_path explicitly!
-                                write_to_excel(json_result, run_for=run_for, file_path=excel_output_path)
-                                
-                    except Exception as e:
-                        st.error(f"❌ Text Error in {pair_name}: {e}")
-
-                    # --- PHASE 2: Table Pipeline ---
-                    try:
-                        merged_tmp_path = write_temp_merged_pdf(fw_path, spo_path)
-                        
-                        if merged_tmp_path:
-                            extracted_text = call_whisperer_and_get_text(merged_tmp_path)
-                            parsed_dict = parser_for_table(extracted_text, config.PROMPTS_TABLE)
-                            writer_to_excel_table(parsed_dict, excel_output_path)
-                            
-                            if os.path.exists(merged_tmp_path):
-                                os.remove(merged_tmp_path)
-                    except Exception as e:
-                        st.error(f"❌ Table Error in {pair_name}: {e}")
-
-                    # Update progress
-                    main_progress.progress((idx + 1) / len(pairs))
+                        for idx, p in enumerate(pairs)
+                    ]
+
+                    for future in as_completed(futures):
+                        pair_name, text_err, table_err = future.result()
+                        completed += 1
+
+                        if text_err:
+                            st.error(f"❌ Text Error in {pair_name}: {text_err}")
+                        if table_err:
+                            st.error(f"❌ Table Error in {pair_name}: {table_err}")
+
+                        status_text.markdown(f"### Finished: **{pair_name}** ({completed}/{len(pairs)})")
+
+                        # Update progress
+                        main_progress.progress(completed / len(pairs))
+
+                # Serialize the consolidated report once, in memory, for the download button
+                file_data = None
+                if workbook.sheetnames:
+                    buffer = io.BytesIO()
+                    workbook.save(buffer)
+                    file_data = buffer.getvalue()
 
                 st.success("✅ Batch Processing Complete!")
                 
                 # Download Button
-                if os.path.exists(excel_output_path):
-                    with open(excel_output_path, "rb") as f:
-                        file_data = f.read()
-                    
+                if file_data:
                     st.download_button(
                         label="📥 Download Co   nsolidated Excel Report",
                         data=file_data,
@@ -0,0 +1,186 @@
+"""
+cache.py
+
+Small on-disk cache for expensive, deterministic pipeline steps (e.g. PDF text
+extraction), keyed by a hash of the input files' contents.
+
+Entries are pickled to CACHE_DIR/<namespace>/<key>.pkl. Each namespace keeps at
+most CACHE_MAX_ENTRIES entries on disk, evicting the least recently used ones,
+and recent entries are also kept in memory for repeat hits in the same session.
+
+Functions:
+- file_digest(*paths: str, extra: str = "") -> str
+    Hashes the contents of one or more files (plus optional extra key material).
+
+- text_digest(texts: Iterable[str], extra: str = "") -> str
+    Hashes a sequence of strings (plus optional extra key material).
+
+- cache_get(namespace: str, key: str) -> Any
+    Returns the cached value, or None on a miss.
+
+- cache_put(namespace: str, key: str, value: Any) -> None
+    Stores a value and evicts the oldest entries beyond CACHE_MAX_ENTRIES.
+"""
+
+import os
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable
+
+from config import CACHE_DIR, CACHE_MAX_ENTRIES
+
+# Recent entries kept in memory (LRU). The app reads and writes it from several
+# pair threads at once, so every access goes through _lock.
+_memory = OrderedDict()
+_lock = threading.Lock()
+
+
+def file_digest(*paths: str, extra: str = "") -> str:
+    """
+    Hash the contents of one or more files into a cache key.
+
+    Args:
+        *paths (str): Files to hash, in order.
+        extra (str): Additional key material (e.g. processing parameters).
+
+    Returns:
+        str: Hex digest.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        h.update(b"\0")
+    h.update(extra.encode("utf-8"))
+    return h.hexdigest()
+
+
+def text_digest(texts: Iterable[str], extra: str = "") -> str:
+    """
+    Hash a sequence of strings into a cache key.
+
+    Args:
+        texts (Iterable[str]): Strings to hash, in order.
+        extra (str): Additional key material (e.g. processing parameters).
+
+    Returns:
+        str: Hex digest.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for text in texts:
+        h.update(text.encode("utf-8"))
+        h.update(b"\0")
+    h.update(extra.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _entry_path(namespace: str, key: str) -> str:
+    return os.path.join(CACHE_DIR, namespace, f"{key}.pkl")
+
+
+def cache_get(namespace: str, key: str) -> Any:
+    """
+    Look up a cached value, first in memory and then on disk.
+
+    Returns:
+        Any: The cached value, or None if there is no entry.
+    """
+    with _lock:
+        if (namespace, key) in _memory:
+            _memory.move_to_end((namespace, key))
+            return _memory[(namespace, key)]
+
+    path = _entry_path(namespace, key)
+    try:
+        with open(path, "rb") as f:
+            value = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # A truncated or stale pickle can fail in many ways (EOFError, AttributeError,
+        # ImportError, ...); drop the bad entry and treat it as a miss
+        print(f"Discarding unreadable cache entry {namespace}/{key}: {e!r}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    # Refresh the modification time so LRU eviction keeps this entry
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    _remember(namespace, key, value)
+    return value
+
+
+def cache_put(namespace: str, key: str, value: Any) -> None:
+    """
+    Store a value in memory and on disk, then evict old entries in the namespace.
+
+    The cache is best-effort: disk errors (e.g. an unwritable CACHE_DIR) are
+    logged and never fail the pipeline step that produced the value.
+    """
+    _remember(namespace, key, value)
+
+    folder = os.path.join(CACHE_DIR, namespace)
+    path = _entry_path(namespace, key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(folder, exist_ok=True)
+
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Cache write skipped for {namespace}/{key}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return
+
+    _evict(folder)
+
+
+def _remember(namespace: str, key: str, value: Any) -> None:
+    with _lock:
+        _memory[(namespace, key)] = value
+        _memory.move_to_end((namespace, key))
+        while len(_memory) > CACHE_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def _evict(folder: str) -> None:
+    """
+    Delete the least recently used entries beyond CACHE_MAX_ENTRIES.
+    """
+    # Other threads may evict the same entries concurrently, so an entry can
+    # disappear between the scan and its stat(); that is not an error here.
+    entries = []
+    try:
+        with os.scandir(folder) as it:
+            for e in it:
+                if e.name.endswith(".pkl"):
+                    try:
+                        entries.append((e.stat().st_mtime, e.path))
+                    except OSError:
+                        pass
+    except OSError as e:
+        print(f"Cache eviction skipped for {folder}: {e}")
+        return
+    if len(entries) <= CACHE_MAX_ENTRIES:
+        return
+
+    entries.sort()
+    for _, path in entries[:len(entries) - CACHE_MAX_ENTRIES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
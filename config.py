@@ -5,6 +5,8 @@ Contains constants used across the project, including file paths,
 model names, and parameters for text chunking and retrieval.
 """
 
+import re
+
 # Path to the Excel file where data is stored
 EXCEL_FILE = "Output.xlsx"
 # Folder containing all main framework files
@@ -22,7 +24,21 @@ PROMPTS_TABLE = "Prompts/prompts_table.json"
 #Whisper Base
 WHISPERER_BASE = "https://llmwhisperer-api.us-central.unstract.com/api/v2"
 
+# PDF filename classification, shared by the CLI, the table pipeline and the app.
+# A framework PDF matches FW_RE but not SPO_RE ("spoc" and "second-party-opinion"
+# are covered by "spo" and "second").
+FW_RE = re.compile(r"framework", re.IGNORECASE)
+SPO_RE = re.compile(r"spo|second|opinion", re.IGNORECASE)
+
+# Table pipeline (main_table): pack several companies' table texts into one
+# structured-output request instead of one concurrent request per company
+TABLE_BATCH_REQUESTS = False
+
 # Retrieval parameters
 TOP_K = 6          # Number of top results to retrieve
 CHUNK_SIZE = 2000  # Size of text chunks for processing
 OVERLAP = 200      # Overlap between consecutive chunks
+
+# On-disk cache for PDF extraction and table detection results
+CACHE_DIR = ".cache"
+CACHE_MAX_ENTRIES = 50  # Per cache namespace; least recently used entries are evicted
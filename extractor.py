@@ -5,8 +5,8 @@ This module provides utilities to extract and chunk textual data from PDF files,
 specifically designed for SPO and Framework PDFs in the SPO-Framework-Extractor pipeline.
 
 Functions:
-- extract_text_from_pdf(pdf_path: str) -> List[str]
-    Extracts raw text from each page of a PDF and returns a list of page texts.
+- extract_text_from_pdf(pdf_path: str) -> Iterator[str]
+    Extracts raw text from each page of a PDF, yielding one page text at a time.
 
 - chunk_text(text: str, chunk_size: int = 2000, overlap: int = 200) -> List[str]
     Splits a single string into overlapping text chunks of specified size.
@@ -17,26 +17,53 @@ Functions:
     of dictionaries containing chunk data, source, page number, chunk index, and folder.
 """
 
-import pdfplumber
-from typing import List, Dict
+import fitz  # PyMuPDF
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Dict
 
-def extract_text_from_pdf(path: str) -> List[str]:
+from cache import file_digest, cache_get, cache_put
+
+# Plain-text extraction flags: keep whitespace and clip to the page area. Ligatures
+# are expanded (no TEXT_PRESERVE_LIGATURES) so "ﬁ"/"ﬂ" tokenize like "fi"/"fl".
+TEXT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+
+# PyMuPDF is not thread-safe and holds the GIL, so PDFs are read in worker
+# processes: the framework and SPO run in parallel, and pairs processed on
+# different threads never share a fitz instance. "spawn" avoids forking a
+# multithreaded process. The pool is created on first use and shared.
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=max(2, multiprocessing.cpu_count()),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_pool
+
+
+def extract_text_from_pdf(path: str) -> Iterator[str]:
     """
-    Extract text from a PDF file.
+    Extract text from a PDF file, one page at a time.
 
     Args:
         path (str): Path to the PDF file.
 
-    Returns:
-        List[str]: List of strings, one per page. Index 0 corresponds to page 1.
-                   If a page has no text, returns an empty string for that page.
+    Yields:
+        str: Text of each page in order, starting with page 1.
+             If a page has no text, yields an empty string for that page.
     """
-    pages = []
-    with pdfplumber.open(path) as pdf:
-        for p in pdf.pages:
-            text = p.extract_text() or ""
-            pages.append(text)
-    return pages
+    # Pages are loaded one at a time and released after their text is read,
+    # so memory stays flat even for very long PDFs.
+    with fitz.open(path) as doc:
+        for page in doc:
+            yield page.get_text("text", flags=TEXT_FLAGS) or ""
 
 
 def chunk_text(text: str, chunk_size: int = 2000, overlap: int = 200) -> List[str]:
@@ -51,16 +78,28 @@ def chunk_text(text: str, chunk_size: int = 2000, overlap: int = 200) -> List[st
     Returns:
         List[str]: List of text chunks. Returns an empty list if text is empty.
     """
-    if not text:
-        return []
-    chunks = []
     step = chunk_size - overlap
-    i = 0
-    while i < len(text):
-        chunk = text[i:i + chunk_size]
-        chunks.append(chunk.strip())
-        i += step
-    return chunks
+    return [text[i:i + chunk_size].strip() for i in range(0, len(text), step)]
+
+
+def _chunk_pdf(path: str, source: str, chunk_size: int, overlap: int, folder_name: str) -> List[Dict]:
+    """
+    Extract and chunk a single PDF, dropping each page's text as soon as it is chunked.
+    """
+    pdf_chunks = []
+    for idx, page_text in enumerate(extract_text_from_pdf(path), start=1):
+        page_chunks = chunk_text(page_text, chunk_size=chunk_size, overlap=overlap)
+        pdf_chunks.extend([
+            {
+                "chunk": chunk,
+                "source": source,
+                "page": idx,
+                "chunk_index": c_idx,
+                "folder": folder_name
+            }
+            for c_idx, chunk in enumerate(page_chunks, start=1)
+        ])
+    return pdf_chunks
 
 
 def extract_chunks_from_two_pdfs(
@@ -73,6 +112,9 @@ def extract_chunks_from_two_pdfs(
     """
     Extract text from two PDFs (framework and SPO), chunk each page, and return structured chunks.
 
+    Results are cached on disk keyed by the PDFs' contents, the chunking
+    parameters and the text extraction flags, so re-running on the same files skips extraction entirely.
+
     Args:
         framework_pdf (str): Path to the framework PDF.
         spo_pdf (str): Path to the SPO PDF.
@@ -90,19 +132,25 @@ def extract_chunks_from_two_pdfs(
                 "folder": str or None  # Folder/company name
             }
     """
+    # TEXT_FLAGS changes the extracted text, so it is part of the key
+    key = file_digest(framework_pdf, spo_pdf, extra=f"{chunk_size}:{overlap}:flags={TEXT_FLAGS}")
+    cached = cache_get("chunks", key)
+    if cached is not None:
+        return [{**c, "folder": folder_name} for c in cached]
+
     all_chunks = []
 
-    for path, source in [(framework_pdf, "framework"), (spo_pdf, "spo")]:
-        pages = extract_text_from_pdf(path)
-        for idx, page_text in enumerate(pages, start=1):
-            page_chunks = chunk_text(page_text, chunk_size=chunk_size, overlap=overlap)
-            for c_idx, chunk in enumerate(page_chunks, start=1):
-                all_chunks.append({
-                    "chunk": chunk,
-                    "source": source,
-                    "page": idx,
-                    "chunk_index": c_idx,
-                    "folder": folder_name
-                })
+    jobs = [(framework_pdf, "framework"), (spo_pdf, "spo")]
+
+    # Extract and chunk both PDFs concurrently in worker processes; results are
+    # joined in job order so the framework chunks always come before the SPO chunks.
+    pool = _get_pdf_pool()
+    futures = [
+        pool.submit(_chunk_pdf, path, source, chunk_size, overlap, folder_name)
+        for path, source in jobs
+    ]
+    for future in futures:
+        all_chunks.extend(future.result())
 
+    cache_put("chunks", key, all_chunks)
     return all_chunks
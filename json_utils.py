@@ -0,0 +1,58 @@
+"""
+json_utils.py
+
+Helpers for pulling JSON out of LLM output, shared by parser.py and table_parser.py.
+Kept free of heavy imports so either parser can use them cheaply.
+
+Functions:
+- extract_json_span(text: str) -> Optional[str]
+    Returns the first balanced {...} or [...] span in text, in a single pass.
+"""
+
+import re
+
+
+# The only characters that matter when scanning for a balanced JSON span
+_JSON_TOKEN_RE = re.compile(r'[{}\[\]"\\]')
+
+
+def extract_json_span(text: str):
+    """
+    Return the first balanced {...} or [...] span in text, in a single pass.
+
+    Brackets inside string literals are ignored. If the span is never closed
+    (e.g. truncated output), everything from its start is returned.
+
+    Returns:
+        str or None: The span, or None if text contains no { or [.
+    """
+    start = None
+    depth = 0
+    in_string = False
+    skip_to = -1
+
+    # finditer jumps straight between brackets, quotes and backslashes, so
+    # ordinary text is skipped in C instead of one character at a time
+    for m in _JSON_TOKEN_RE.finditer(text):
+        i, ch = m.start(), m.group()
+        if i < skip_to:
+            continue
+        if start is None:
+            if ch in "{[":
+                start, depth = i, 1
+            continue
+        if in_string:
+            if ch == "\\":
+                skip_to = i + 2  # the escaped character is never structural
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+
+    return text[start:] if start is not None else None
@@ -21,9 +21,10 @@ Functions:
 """
 
 import os
-import re
 import json
 import time
+import asyncio
+from openpyxl import Workbook, load_workbook
 
 from extractor import extract_chunks_from_two_pdfs
 from parser import parse_with_llm_groq #for Groq
@@ -32,11 +33,12 @@ from parser import parse_with_llm_openai #for OpenAI
 from writer import write_to_excel   
 
 from table_extractor import process_subfolders_in_memory
-from table_parser import parser_for_table #Currently Using OpenAI Parsing
+from table_parser import parse_tables_async, parse_tables_batched #Currently Using OpenAI Parsing
 from table_writer import writer_to_excel_table
 
 from config import EXCEL_FILE, MAIN_FOLDER, GROQ_MODEL, GEMINI_MODEL, OPENAI_MODEL
 from config import TOP_K, CHUNK_SIZE, OVERLAP , PROMPTS_FILE , PROMPTS_TABLE
+from config import FW_RE, SPO_RE, TABLE_BATCH_REQUESTS
 
 
 
@@ -46,9 +48,9 @@ def find_pdf_pair(folder_path: str):
     Identify and return the framework and SPO PDF pair in a folder.
 
     Framework PDF:
-        - Must contain 'framework' but NOT 'spo', 'second', or 'second-party-opinion'.
+        - Must contain 'framework' but NOT 'spo', 'second', or 'opinion'.
     SPO PDF:
-        - Must contain 'spo', 'spoc', 'second', or 'second-party-opinion'.
+        - Must contain 'spo', 'second', or 'opinion' (config.SPO_RE).
 
     If the folder contains exactly two PDFs and no strict match is found, the two PDFs
     are assumed to be the framework and SPO pair.
@@ -60,22 +62,25 @@ def find_pdf_pair(folder_path: str):
         Tuple[str, str]: Paths to the framework PDF and SPO PDF respectively.
                          Returns (None, None) if no valid pair is found.
     """
-    files = os.listdir(folder_path)
     framework = None
     spo = None
+    pdfs = []
 
-    for f in files:
-        lf = f.lower()
-        if lf.endswith(".pdf"):
+    with os.scandir(folder_path) as it:
+        for entry in it:
+            if not entry.name.lower().endswith(".pdf"):
+                continue
+            pdfs.append(entry.path)
+
+            is_spo = SPO_RE.search(entry.name)
             # Strict framework condition
-            if "framework" in lf and not any(word in lf for word in ["spo", "second", "second-party-opinion"]):
-                framework = os.path.join(folder_path, f)
+            if FW_RE.search(entry.name) and not is_spo:
+                framework = entry.path
             # SPO detection
-            elif any(word in lf for word in ["spo", "spoc", "second", "second-party-opinion"]):
-                spo = os.path.join(folder_path, f)
+            elif is_spo:
+                spo = entry.path
 
     # Fallback: if exactly two PDFs exist, assume they're a pair
-    pdfs = [os.path.join(folder_path, f) for f in files if f.lower().endswith(".pdf")]
     if not (framework and spo) and len(pdfs) == 2:
         framework, spo = pdfs[0], pdfs[1]
 
@@ -121,28 +126,51 @@ def main():
             run_for = r.get("run_for")
             json_result = r.get("result", {})
             if run_for and isinstance(json_result, dict):
-                write_to_excel(json_result, run_for=run_for)
+                write_to_excel(json_result, run_for=run_for, file_path=EXCEL_FILE)
                 
     
 def main_table():
     """
-    Run the tabular data pipeline sequentially for each subfolder in MAIN_FOLDER.
+    Run the tabular data pipeline for each subfolder in MAIN_FOLDER.
 
     Workflow:
     1. Extract tables (via process_subfolders_in_memory, now yields results per company).
-    2. Parse tables using table_parser.
-    3. Write parsed data into Excel via table_writer.
+    2. Parse all companies' tables concurrently using table_parser
+       (or packed into shared requests when TABLE_BATCH_REQUESTS is set).
+    3. Write parsed data into Excel via table_writer, one company at a time.
+       The workbook is loaded once, filled in memory and saved once at the end.
     """
 
-    for company, text in process_subfolders_in_memory(MAIN_FOLDER):
+    extracted = list(process_subfolders_in_memory(MAIN_FOLDER))
+    if TABLE_BATCH_REQUESTS:
+        # Fewer requests against the rate limit; the shared instruction is sent once per batch
+        parsed = parse_tables_batched([text for _, text in extracted], PROMPTS_TABLE, openai_model=OPENAI_MODEL)
+    else:
+        parsed = asyncio.run(parse_tables_async(
+            [(text, PROMPTS_TABLE) for _, text in extracted],
+            openai_model=OPENAI_MODEL
+        ))
+
+    if os.path.exists(EXCEL_FILE):
+        workbook = load_workbook(EXCEL_FILE)
+    else:
+        # New workbook; the writer adds its sheets on first use
+        workbook = Workbook()
+        workbook.remove(workbook.active)
+
+    for (company, _), parsed_dict in zip(extracted, parsed):
         try:
-            parsed_dict = parser_for_table(text, PROMPTS_TABLE)
-            writer_to_excel_table(parsed_dict, EXCEL_FILE)
+            if isinstance(parsed_dict, Exception):
+                raise parsed_dict
+            writer_to_excel_table(parsed_dict, workbook=workbook)
             print(f"✅ Completed pipeline for {company}\n")
         except Exception as e:
             print(f"❌ Error processing {company}: {e}")
             continue
 
+    if workbook.sheetnames:
+        workbook.save(EXCEL_FILE)
+
 
 if __name__ == "__main__":
     start_time = time.time()    
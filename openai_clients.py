@@ -0,0 +1,21 @@
+"""
+openai_clients.py
+
+Async OpenAI client construction, shared by parser.py and table_parser.py.
+
+Functions:
+- async_openai_client(api_key: str, max_retries: int) -> AsyncOpenAI
+    Returns an AsyncOpenAI client on the aiohttp transport.
+"""
+
+from openai import AsyncOpenAI, DefaultAioHttpClient
+
+
+def async_openai_client(api_key: str, max_retries: int) -> AsyncOpenAI:
+    """
+    Create an AsyncOpenAI client for one run of concurrent requests.
+
+    The aiohttp transport scales to many concurrent requests better than the
+    default httpx one. Callers that retry in their own loop pass max_retries=0.
+    """
+    return AsyncOpenAI(api_key=api_key, max_retries=max_retries, http_client=DefaultAioHttpClient())
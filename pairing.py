@@ -0,0 +1,124 @@
+"""
+pairing.py
+
+Pairs uploaded Framework PDFs with their SPO PDFs by filename similarity.
+
+Functions:
+- match_pairs(file_list) -> Tuple[List[Dict], List]
+    Groups uploaded files into (Framework, SPO) pairs; returns the pairs and
+    the files that could not be paired.
+"""
+
+import os
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from config import FW_RE, SPO_RE
+
+PREFIX_BUCKET_LEN = 6
+
+
+def _prefix_boost(fw_name, spo_name):
+    # Boost score if they share a prefix (e.g. "Tesla_Framework" vs "Tesla_SPO")
+    return 0.5 if len(os.path.commonprefix([fw_name, spo_name])) > 3 else 0.0
+
+
+def _pair_score(matcher, fw_name, spo_name):
+    """
+    Similarity score between a lowercased framework and SPO filename.
+    `matcher` is the SPO's SequenceMatcher, whose seq2 is already set to spo_name.
+    """
+    # Simple similarity ratio. The framework stays seq1 (ratio() is not symmetric);
+    # set_seq1 is cheap, while the seq2 index built once per SPO is reused.
+    matcher.set_seq1(fw_name)
+    return matcher.ratio() + _prefix_boost(fw_name, spo_name)
+
+
+def match_pairs(file_list):
+    """
+    Groups uploaded files into (Framework, SPO) pairs based on filename similarity.
+
+    Each framework takes the remaining SPO with the highest score (ties go to
+    the earlier SPO), if that score clears the threshold.
+    Returns:
+        pairs: List of dicts {'framework': file, 'spo': file, 'name': str}
+        unmatched: List of files that couldn't be paired
+    """
+    frameworks = []
+    spos = []
+    others = []
+
+    # 1. Bucket files
+    for f in file_list:
+        is_spo = SPO_RE.search(f.name)
+        if FW_RE.search(f.name) and not is_spo:
+            frameworks.append(f)
+        elif is_spo:
+            spos.append(f)
+        else:
+            others.append(f)
+
+    pairs = []
+    used_spos = set()
+
+    # Lowercase every SPO name once and group SPO positions by filename prefix
+    spos_lc = [(spo, spo.name.lower()) for spo in spos]
+    by_prefix = defaultdict(list)
+    for pos, (_, spo_name) in enumerate(spos_lc):
+        by_prefix[spo_name[:PREFIX_BUCKET_LEN]].append(pos)
+
+    # set_seq2 builds the character index, so each SPO name is indexed only once
+    matchers = {}
+    for spo, spo_name in spos_lc:
+        matchers[spo] = SequenceMatcher(None, autojunk=False)
+        matchers[spo].set_seq2(spo_name)
+
+    # 2. Match Frameworks to nearest SPO
+    for fw in frameworks:
+        best_pos = None
+        best_score = 0.0
+        fw_name = fw.name.lower()
+
+        # SPOs sharing the framework's prefix are scored first: they usually win,
+        # so the pass over all other SPOs can skip most of them on the bound below
+        order = by_prefix.get(fw_name[:PREFIX_BUCKET_LEN], []) + list(range(len(spos_lc)))
+        scored = set()
+
+        for pos in order:
+            spo, spo_name = spos_lc[pos]
+            if pos in scored or spo in used_spos:
+                continue
+            scored.add(pos)
+
+            matcher = matchers[spo]
+            if best_pos is not None:
+                # quick_ratio() is an upper bound on ratio(); skip SPOs that can
+                # neither beat the best score nor tie it from an earlier position
+                matcher.set_seq1(fw_name)
+                bound = matcher.quick_ratio() + _prefix_boost(fw_name, spo_name)
+                if bound < best_score or (bound == best_score and pos > best_pos):
+                    continue
+
+            score = _pair_score(matcher, fw_name, spo_name)
+            if score > best_score or (best_pos is not None and score == best_score and pos < best_pos):
+                best_score = score
+                best_pos = pos
+
+        best_match = spos_lc[best_pos][0] if best_pos is not None else None
+        if best_match and best_score > 0.4:  # Threshold to avoid bad matches
+            used_spos.add(best_match)
+            # Create a display name based on the common prefix
+            pairs.append({
+                "name": os.path.commonprefix([fw.name, best_match.name]).strip("-_ "),
+                "framework": fw,
+                "spo": best_match
+            })
+        else:
+            others.append(fw)
+
+    # Add remaining unmatched SPOs to others
+    for spo in spos:
+        if spo not in used_spos:
+            others.append(spo)
+
+    return pairs, others
@@ -13,16 +13,20 @@ It supports:
 
 import os
 import json
+import asyncio
+import threading
 import numpy as np
 import time
-import re
 import openai
+import orjson
 
-from typing import List, Dict, Any
-from sklearn.feature_extraction.text import TfidfVectorizer
+from typing import List, Dict, Any, Protocol
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.pipeline import make_pipeline
 from sklearn.metrics.pairwise import cosine_similarity
-from groq import Groq
-from openai import OpenAI
+from groq import Groq, AsyncGroq
+from openai import OpenAI, AsyncOpenAI
+from json_repair import repair_json
 
 from google import genai
 from google.genai import types
@@ -30,6 +34,13 @@ from google.genai import types
 from dotenv import load_dotenv
 load_dotenv()
 
+from cache import text_digest, cache_get, cache_put
+from json_utils import extract_json_span
+from openai_clients import async_openai_client
+
+# Hashed feature space for TF-IDF; large enough that collisions are negligible
+TFIDF_N_FEATURES = 2 ** 18
+
 
 # ---------------- TF-IDF Retrieval ---------------- #
 
@@ -42,17 +53,39 @@ def build_tfidf_index(chunks: List[Dict]) -> Dict:
 
     Returns:
         Dict: {
-            "vectorizer": TfidfVectorizer object,
+            "vectorizer": HashingVectorizer + TfidfTransformer pipeline,
             "matrix": TF-IDF feature matrix,
             "texts": List[str] of chunk texts
         }
     """
     texts = [c["chunk"] for c in chunks]
-    vectorizer = TfidfVectorizer(stop_words="english", max_features=20000)
+    # Hashing needs no vocabulary dict; only the IDF weights are fitted.
+    # norm=None keeps raw term counts so the transformer applies IDF and L2 like TfidfVectorizer.
+    vectorizer = make_pipeline(
+        HashingVectorizer(n_features=TFIDF_N_FEATURES, stop_words="english", alternate_sign=False, norm=None),
+        TfidfTransformer()
+    )
     matrix = vectorizer.fit_transform(texts) if texts else None
     return {"vectorizer": vectorizer, "matrix": matrix, "texts": texts}
 
 
+def build_tfidf_index_cached(chunks: List[Dict]) -> Dict:
+    """
+    Same as `build_tfidf_index`, but cached on disk by the chunk texts.
+
+    Re-running the prompts on the same PDFs (e.g. while tuning prompts) then
+    loads the fitted vectorizer and matrix instead of refitting them.
+    """
+    key = text_digest((c["chunk"] for c in chunks), extra=f"english:hashing:{TFIDF_N_FEATURES}")
+    cached = cache_get("tfidf", key)
+    if cached is not None:
+        return cached
+
+    index = build_tfidf_index(chunks)
+    cache_put("tfidf", key, index)
+    return index
+
+
 def retrieve_top_k(query: str, index: Dict, k: int = 5) -> List[int]:
     """
     Retrieve indices of top-k most similar chunks to the query.
@@ -64,15 +97,61 @@ def retrieve_top_k(query: str, index: Dict, k: int = 5) -> List[int]:
 
     Returns:
         List[int]: List of top-k indices into index['texts'] with positive similarity.
+                   If there are no more than k texts, all of them in order.
     """
+    n_texts = len(index["texts"])
+    if n_texts <= k:
+        # Every chunk fits in the context anyway, no need to score them
+        return list(range(n_texts))
     if index["matrix"] is None:
         return []
     qv = index["vectorizer"].transform([query])
     sims = cosine_similarity(qv, index["matrix"]).flatten()
-    topk_idx = np.argsort(-sims)[:k]
+    if k < sims.size:
+        # Linear-time selection of the top k, then sort only those k
+        part = np.argpartition(-sims, k)[:k]
+        topk_idx = part[np.argsort(-sims[part])]
+    else:
+        topk_idx = np.argsort(-sims)
     return [int(i) for i in topk_idx if sims[i] > 0]
 
 
+def retrieve_top_k_batch(queries: List[str], index: Dict, k: int = 5) -> List[List[int]]:
+    """
+    Retrieve the top-k chunks for several queries with a single transform and similarity call.
+
+    Args:
+        queries (List[str]): Query strings.
+        index (Dict): TF-IDF index from `build_tfidf_index`.
+        k (int): Number of top results to return per query.
+
+    Returns:
+        List[List[int]]: For each query, the same list `retrieve_top_k` would return.
+    """
+    n_texts = len(index["texts"])
+    if n_texts <= k:
+        return [list(range(n_texts)) for _ in queries]
+    if index["matrix"] is None or not queries:
+        return [[] for _ in queries]
+
+    qm = index["vectorizer"].transform(queries)
+    sims = cosine_similarity(qm, index["matrix"])  # shape (queries, chunks)
+
+    # argpartition picks each row's top k in linear time; only those k get sorted
+    n_chunks = sims.shape[1]
+    if k < n_chunks:
+        part = np.argpartition(-sims, k, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(n_chunks), (len(queries), 1))
+    rows = np.arange(len(queries))[:, None]
+    topk_idx = part[rows, np.argsort(-sims[rows, part], axis=1)]
+
+    return [
+        [int(i) for i in topk_idx[r] if sims[r, i] > 0]
+        for r in range(len(queries))
+    ]
+
+
 def assemble_context(chunks: List[Dict], top_indices: List[int]) -> str:
     """
     Assemble a human-readable context block from selected chunks.
@@ -92,6 +171,288 @@ def assemble_context(chunks: List[Dict], top_indices: List[int]) -> str:
     return "\n\n---\n\n".join(parts)
 
 
+# ---------------- Prompt Assembly ---------------- #
+
+def _run_for(p: Dict) -> str:
+    """
+    Which chunks a prompt runs on: "framework", "spo" or "both".
+    """
+    run_for = p.get("run_for", "both").lower()
+    return run_for if run_for in ("framework", "spo") else "both"
+
+
+def _prepare_indices(chunks: List[Dict], prompts: List[Dict], top_k: int = 5) -> Dict[str, Dict]:
+    """
+    Build one TF-IDF index per chunk subset the prompts ask for.
+
+    The subset only depends on `run_for`, so there are at most three indices
+    no matter how many prompts there are. Each index also keeps its chunk
+    dicts under "chunks" for `assemble_context`. Subsets of at most top_k
+    chunks are used whole, so no vectorizer is fitted for them.
+
+    Returns:
+        Dict[str, Dict]: TF-IDF index keyed by "framework", "spo" or "both".
+    """
+    # Partition the chunks by source in a single pass
+    by_source = {"framework": [], "spo": [], "both": chunks}
+    for c in chunks:
+        source = c.get("source")
+        if source in ("framework", "spo"):
+            by_source[source].append(c)
+
+    indices = {}
+    for run_for in {_run_for(p) for p in prompts}:
+        relevant_chunks = by_source[run_for]
+        if len(relevant_chunks) <= top_k:
+            index = {"vectorizer": None, "matrix": None, "texts": [c["chunk"] for c in relevant_chunks]}
+        else:
+            index = build_tfidf_index_cached(relevant_chunks)
+        # Copy so the cached index is not tied to this pair's chunk dicts
+        indices[run_for] = {**index, "chunks": relevant_chunks}
+    return indices
+
+
+def _build_messages(p: Dict, index: Dict, top_idx: List[int]):
+    """
+    Build the chat messages for a single prompt from its retrieved context.
+
+    All top-k chunks are packed into one user message (see `assemble_context`),
+    so each prompt costs a single LLM call regardless of k.
+
+    Args:
+        p (Dict): Prompt entry from the prompts JSON file.
+        index (Dict): The prompt's TF-IDF index from `_prepare_indices`.
+        top_idx (List[int]): Indices of the retrieved chunks in index["chunks"].
+
+    Returns:
+        Tuple[str, List[int], List[Dict]]: (run_for, used context indices, messages)
+    """
+    run_for = p.get("run_for", "both").lower()
+    context = assemble_context(index["chunks"], top_idx)
+
+    system_msg = {
+        "role": "system",
+        "content": (
+            "You are a JSON extraction assistant. Use ONLY the provided CONTEXT to answer. "
+            "Output must be valid JSON and must match the provided schema or example. "
+            "If a field cannot be found in the context, set it to null or an empty string."
+        )
+    }
+
+    user_content = (
+        f"CONTEXT:\n\n{context}\n\n"
+        f"INSTRUCTION:\n\n{p['instruction']}\n\n"
+        f"OUTPUT_SCHEMA / EXAMPLE:\n\n{json.dumps(p['json_schema'], separators=(',', ':'))}\n\n"
+        "Return ONLY the JSON (no extra commentary)."
+    )
+    user_msg = {"role": "user", "content": user_content}
+
+    return run_for, top_idx, [system_msg, user_msg]
+
+
+def _build_all_messages(chunks: List[Dict], prompts: List[Dict], top_k: int = 5) -> List[tuple]:
+    """
+    Retrieve the context for every prompt and build its chat messages.
+
+    Prompts that share an index are retrieved together with one
+    `retrieve_top_k_batch` call.
+
+    Returns:
+        List[tuple]: (run_for, used context indices, messages) per prompt, in prompt order.
+    """
+    indices = _prepare_indices(chunks, prompts, top_k)
+    top = [None] * len(prompts)
+
+    for key, index in indices.items():
+        members = [n for n, p in enumerate(prompts) if _run_for(p) == key]
+        queries = [prompts[n].get("instruction") or prompts[n].get("query") or "" for n in members]
+        for n, top_idx in zip(members, retrieve_top_k_batch(queries, index, k=top_k)):
+            top[n] = top_idx
+
+    return [_build_messages(p, indices[_run_for(p)], top[n]) for n, p in enumerate(prompts)]
+
+
+def _parse_json_content(content: str) -> Any:
+    """
+    Parse model output as JSON.
+
+    Tries the whole output first, then the first balanced {...} or [...] span
+    (e.g. when the model wraps the JSON in prose or a code fence), and finally
+    lets json_repair fix that span (trailing commas, missing quotes, truncation).
+
+    Returns:
+        Any: Parsed JSON, or {"_raw": content} if nothing could be parsed.
+    """
+    try:
+        return orjson.loads(content)
+    except Exception:
+        pass
+
+    span = extract_json_span(content or "")
+    if span is None:
+        return {"_raw": content}
+
+    try:
+        return orjson.loads(span)
+    except Exception:
+        pass
+
+    try:
+        repaired = orjson.loads(repair_json(span))
+    except Exception:
+        return {"_raw": content}
+    return repaired if isinstance(repaired, (dict, list)) else {"_raw": content}
+
+
+# ---------------- Concurrent Prompt Dispatch ---------------- #
+
+# Maximum number of LLM requests in flight at once for a single pair
+LLM_MAX_CONCURRENCY = 10
+
+
+class LLMProvider(Protocol):
+    """
+    Adapter for one LLM API, used by `_parse` to run the prompts.
+
+    Attributes:
+        api_key_env (str): Environment variable holding the API key.
+        model (str): Model name.
+    """
+    api_key_env: str
+    model: str
+
+    def open_client(self, api_key: str) -> Any:
+        """Create the async client used for all prompts of one run."""
+
+    async def close_client(self, client: Any) -> None:
+        """Release the client once every prompt has finished."""
+
+    async def complete(self, client: Any, messages: List[Dict], temperature: float = 0.0) -> str:
+        """Send one chat request and return the model's text output."""
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before retrying a failed LLM call.
+
+    Rate-limit (429) and server (5xx) errors back off exponentially; anything
+    else retries linearly, like the synchronous `call_*` helpers.
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and (status == 429 or status >= 500):
+        return 2.0 ** attempt
+    return 1.0 * attempt
+
+
+async def _call_with_retries(make_call, semaphore: asyncio.Semaphore, max_retries: int = 3):
+    """
+    Await `make_call()` under the semaphore, retrying failed attempts.
+    """
+    for attempt in range(1, max_retries + 1):
+        try:
+            async with semaphore:
+                return await make_call()
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(_retry_delay(e, attempt))
+
+
+async def _parse(
+    provider: LLMProvider,
+    chunks: List[Dict],
+    prompts_path: str,
+    top_k: int = 5,
+    max_concurrency: int = LLM_MAX_CONCURRENCY
+) -> List[Dict]:
+    """
+    Run every prompt concurrently through the provider and collect the results in prompt order.
+
+    Args:
+        provider (LLMProvider): Provider adapter to send the requests with.
+        chunks (List[Dict]): All chunks extracted from the PDF pair.
+        prompts_path (str): Path to the prompts JSON file.
+        top_k (int): Number of chunks to retrieve as context.
+        max_concurrency (int): Maximum number of requests in flight at once.
+
+    Returns:
+        List[Dict]: One result dict per prompt.
+    """
+    api_key = os.getenv(provider.api_key_env)
+    if not api_key:
+        raise EnvironmentError(f"{provider.api_key_env} not set in environment.")
+
+    with open(prompts_path, "r", encoding="utf-8") as f:
+        prompts = json.load(f)
+
+    built = _build_all_messages(chunks, prompts, top_k)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    client = provider.open_client(api_key)
+    try:
+        contents = await asyncio.gather(*[
+            _call_with_retries(lambda messages=messages: provider.complete(client, messages, 0.0), semaphore)
+            for _, _, messages in built
+        ])
+    finally:
+        await provider.close_client(client)
+
+    results = []
+
+    for p, (run_for, top_idx, _), content in zip(prompts, built, contents):
+        results.append({
+            "prompt_id": p.get("id"),
+            "run_for": run_for,
+            "result": _parse_json_content(content),
+            "used_context_indices": top_idx,
+            "raw_model_output": content
+        })
+
+    return results
+
+
+def _split_messages(messages: List[Dict]):
+    """
+    Split chat messages into Gemini's (user contents, system instructions).
+    """
+    user_messages = [m["content"] for m in messages if m["role"] == "user"]
+    system_messages = [m["content"] for m in messages if m["role"] == "system"]
+    return user_messages, system_messages
+
+
+def _chat_content(resp) -> str:
+    """
+    Text output of an OpenAI-compatible chat completion (OpenAI, Groq).
+    """
+    try:
+        return resp.choices[0].message.content
+    except Exception:
+        return str(resp)
+
+
+# ---------------- Shared Sync Clients ---------------- #
+
+# One client per (SDK class, API key), reused so HTTP connections are kept alive
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(factory, api_key: str, **options):
+    """
+    Return the shared sync client for this SDK class, API key and constructor
+    options (e.g. max_retries), creating it on first use.
+
+    Keyed by API key as well, so a key entered later (e.g. in the app sidebar)
+    gets its own client instead of reusing one bound to an old key.
+    """
+    key = (factory, api_key, tuple(sorted(options.items())))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = factory(api_key=api_key, **options)
+    return client
+
+
 # ---------------- Groq Parsing ---------------- #
 
 def call_groq(model: str, messages: List[Dict], temperature: float = 0.0, max_retries: int = 3) -> Dict:
@@ -111,7 +472,8 @@ def call_groq(model: str, messages: List[Dict], temperature: float = 0.0, max_re
     if not api_key:
         raise EnvironmentError("GROQ_API_KEY not set in environment.")
 
-    client = Groq(api_key=api_key) if hasattr(Groq, "__call__") else Groq()
+    # The loop below does the retrying; SDK retries on top would multiply the attempts
+    client = _get_client(Groq, api_key, max_retries=0)
 
     for attempt in range(1, max_retries + 1):
         try:
@@ -127,73 +489,45 @@ def call_groq(model: str, messages: List[Dict], temperature: float = 0.0, max_re
             time.sleep(1.0 * attempt)
 
 
-def parse_with_llm_groq(chunks: List[Dict], prompts_path: str, groq_model: str, top_k: int = 5) -> List[Dict]:
+class GroqProvider:
     """
-    Parse chunks using Groq LLM based on provided prompts.
+    Groq chat completions through AsyncGroq.
     """
-    with open(prompts_path, "r", encoding="utf-8") as f:
-        prompts = json.load(f)
+    api_key_env = "GROQ_API_KEY"
 
-    results = []
+    def __init__(self, model: str):
+        self.model = model
 
-    for p in prompts:
-        run_for = p.get("run_for", "both").lower()
-        relevant_chunks = (
-            [c for c in chunks if c.get("source") == "framework"] if run_for == "framework"
-            else [c for c in chunks if c.get("source") == "spo"] if run_for == "spo"
-            else chunks
-        )
+    def open_client(self, api_key: str) -> AsyncGroq:
+        # _call_with_retries does the retrying, so the SDK's own retries are off
+        return AsyncGroq(api_key=api_key, max_retries=0)
 
-        index = build_tfidf_index(relevant_chunks)
-        query = p.get("instruction") or p.get("query") or ""
-        top_idx = retrieve_top_k(query, index, k=top_k)
-        context = assemble_context(relevant_chunks, top_idx)
-
-        system_msg = {
-            "role": "system",
-            "content": (
-                "You are a JSON extraction assistant. Use ONLY the provided CONTEXT to answer. "
-                "Output must be valid JSON and must match the provided schema or example. "
-                "If a field cannot be found in the context, set it to null or an empty string."
-            )
-        }
+    async def close_client(self, client: AsyncGroq) -> None:
+        await client.close()
 
-        user_content = (
-            f"CONTEXT:\n\n{context}\n\n"
-            f"INSTRUCTION:\n\n{p['instruction']}\n\n"
-            f"OUTPUT_SCHEMA / EXAMPLE:\n\n{json.dumps(p['json_schema'], indent=2)}\n\n"
-            "Return ONLY the JSON (no extra commentary)."
-        )
-        user_msg = {"role": "user", "content": user_content}
+    async def complete(self, client: AsyncGroq, messages: List[Dict], temperature: float = 0.0) -> str:
+        resp = await client.chat.completions.create(model=self.model, messages=messages, temperature=temperature)
+        return _chat_content(resp)
 
-        resp = call_groq(model=groq_model, messages=[system_msg, user_msg], temperature=0.0)
 
-        try:
-            content = resp.choices[0].message.content
-        except Exception:
-            content = str(resp)
+async def aparse_with_llm_groq(
+    chunks: List[Dict],
+    prompts_path: str,
+    groq_model: str,
+    top_k: int = 5,
+    max_concurrency: int = LLM_MAX_CONCURRENCY
+) -> List[Dict]:
+    """
+    Parse chunks using Groq LLM, sending the requests for all prompts concurrently.
+    """
+    return await _parse(GroqProvider(groq_model), chunks, prompts_path, top_k, max_concurrency)
 
-        try:
-            parsed = json.loads(content)
-        except Exception:
-            m = re.search(r'(\{.*\}|\[.*\])', content, flags=re.S)
-            if m:
-                try:
-                    parsed = json.loads(m.group(1))
-                except Exception:
-                    parsed = {"_raw": content}
-            else:
-                parsed = {"_raw": content}
 
-        results.append({
-            "prompt_id": p.get("id"),
-            "run_for": run_for,
-            "result": parsed,
-            "used_context_indices": top_idx,
-            "raw_model_output": content
-        })
-
-    return results
+def parse_with_llm_groq(chunks: List[Dict], prompts_path: str, groq_model: str, top_k: int = 5) -> List[Dict]:
+    """
+    Parse chunks using Groq LLM based on provided prompts.
+    """
+    return asyncio.run(aparse_with_llm_groq(chunks, prompts_path, groq_model, top_k=top_k))
 
 
 # ---------------- Gemini Parsing ---------------- #
@@ -206,12 +540,11 @@ def call_gemini(model_gemini: str, messages: List[Dict], temperature: float = 0.
     if not api_key:
         raise EnvironmentError("GEMINI_API_KEY not set in environment.")
 
-    client = genai.Client(api_key=api_key)
+    client = _get_client(genai.Client, api_key)
 
     for attempt in range(1, max_retries + 1):
         try:
-            user_messages = [m["content"] for m in messages if m["role"] == "user"]
-            system_messages = [m["content"] for m in messages if m["role"] == "system"]
+            user_messages, system_messages = _split_messages(messages)
 
             response = client.models.generate_content(
                 model=model_gemini,
@@ -228,75 +561,55 @@ def call_gemini(model_gemini: str, messages: List[Dict], temperature: float = 0.
             time.sleep(1.0 * attempt)
 
 
-def parse_with_llm_gemini(chunks: List[Dict], prompts_path: str, gemini_model: str, top_k: int = 5) -> List[Dict]:
+class GeminiProvider:
     """
-    Parse chunks using Gemini LLM based on provided prompts.
+    Gemini content generation through the genai client's async (`aio`) interface.
     """
-    with open(prompts_path, "r", encoding="utf-8") as f:
-        prompts = json.load(f)
+    api_key_env = "GEMINI_API_KEY"
 
-    results = []
+    def __init__(self, model: str):
+        self.model = model
 
-    for p in prompts:
-        run_for = p.get("run_for", "both").lower()
-        relevant_chunks = (
-            [c for c in chunks if c.get("source") == "framework"] if run_for == "framework"
-            else [c for c in chunks if c.get("source") == "spo"] if run_for == "spo"
-            else chunks
-        )
+    def open_client(self, api_key: str) -> genai.Client:
+        return genai.Client(api_key=api_key)
 
-        index = build_tfidf_index(relevant_chunks)
-        query = p.get("instruction") or p.get("query") or ""
-        top_idx = retrieve_top_k(query, index, k=top_k)
-        context = assemble_context(relevant_chunks, top_idx)
-
-        system_msg = {
-            "role": "system",
-            "content": (
-                "You are a JSON extraction assistant. Use ONLY the provided CONTEXT to answer. "
-                "Output must be valid JSON and must match the provided schema or example. "
-                "If a field cannot be found in the context, set it to null or an empty string."
-            )
-        }
+    async def close_client(self, client: genai.Client) -> None:
+        pass
 
-        user_content = (
-            f"CONTEXT:\n\n{context}\n\n"
-            f"INSTRUCTION:\n\n{p['instruction']}\n\n"
-            f"OUTPUT_SCHEMA / EXAMPLE:\n\n{json.dumps(p['json_schema'], indent=2)}\n\n"
-            "Return ONLY the JSON (no extra commentary)."
+    async def complete(self, client: genai.Client, messages: List[Dict], temperature: float = 0.0) -> str:
+        user_messages, system_messages = _split_messages(messages)
+        resp = await client.aio.models.generate_content(
+            model=self.model,
+            contents=user_messages,
+            config=types.GenerateContentConfig(
+                system_instruction=system_messages,
+                temperature=temperature
+            )
         )
-        user_msg = {"role": "user", "content": user_content}
-
-        resp = call_gemini(model_gemini=gemini_model, messages=[system_msg, user_msg], temperature=0.0)
-
-        print(getattr(resp, 'usage_metadata', None))
-
         try:
-            content = resp.text
+            return resp.text
         except Exception:
-            content = str(resp)
+            return str(resp)
 
-        try:
-            parsed = json.loads(content)
-        except Exception:
-            m = re.search(r'(\{.*\}|\[.*\])', content, flags=re.S)
-            if m:
-                try:
-                    parsed = json.loads(m.group(1))
-                except Exception:
-                    parsed = {"_raw": content}
-            else:
-                parsed = {"_raw": content}
 
-        results.append({
-            "prompt_id": p.get("id"),
-            "run_for": run_for,
-            "result": parsed,
-            "used_context_indices": top_idx,
-            "raw_model_output": content
-        })
+async def aparse_with_llm_gemini(
+    chunks: List[Dict],
+    prompts_path: str,
+    gemini_model: str,
+    top_k: int = 5,
+    max_concurrency: int = LLM_MAX_CONCURRENCY
+) -> List[Dict]:
+    """
+    Parse chunks using Gemini LLM, sending the requests for all prompts concurrently.
+    """
+    return await _parse(GeminiProvider(gemini_model), chunks, prompts_path, top_k, max_concurrency)
 
-    return results
+
+def parse_with_llm_gemini(chunks: List[Dict], prompts_path: str, gemini_model: str, top_k: int = 5) -> List[Dict]:
+    """
+    Parse chunks using Gemini LLM based on provided prompts.
+    """
+    return asyncio.run(aparse_with_llm_gemini(chunks, prompts_path, gemini_model, top_k=top_k))
 
 # ---------------- OpenAI Parsing ---------------- #
 
@@ -317,7 +630,8 @@ def call_openai(model: str, messages: List[Dict], temperature: float = 0.0, max_
     if not api_key:
         raise EnvironmentError("OPENAI_API_KEY not set in environment.")
     
-    client = OpenAI(api_key=api_key)
+    # The loop below does the retrying; SDK retries on top would multiply the attempts
+    client = _get_client(OpenAI, api_key, max_retries=0)
 
     for attempt in range(1, max_retries + 1):
         try:
@@ -333,70 +647,252 @@ def call_openai(model: str, messages: List[Dict], temperature: float = 0.0, max_
             time.sleep(1.0 * attempt)
 
 
+class OpenAIProvider:
+    """
+    OpenAI chat completions through AsyncOpenAI.
+    """
+    api_key_env = "OPENAI_API_KEY"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def open_client(self, api_key: str) -> AsyncOpenAI:
+        # _call_with_retries does the retrying, so the SDK's own retries are off
+        return async_openai_client(api_key, max_retries=0)
+
+    async def close_client(self, client: AsyncOpenAI) -> None:
+        await client.close()
+
+    async def complete(self, client: AsyncOpenAI, messages: List[Dict], temperature: float = 0.0) -> str:
+        resp = await client.chat.completions.create(model=self.model, messages=messages, temperature=temperature)
+        return _chat_content(resp)
+
+
+async def aparse_with_llm_openai(
+    chunks: List[Dict],
+    prompts_path: str,
+    openai_model: str,
+    top_k: int = 5,
+    max_concurrency: int = LLM_MAX_CONCURRENCY
+) -> List[Dict]:
+    """
+    Parse chunks using OpenAI LLM, sending the requests for all prompts concurrently.
+
+    Results are returned in prompt order, same as `parse_with_llm_openai`.
+    """
+    return await _parse(OpenAIProvider(openai_model), chunks, prompts_path, top_k, max_concurrency)
+
+
 def parse_with_llm_openai(chunks: List[Dict], prompts_path: str, openai_model: str, top_k: int = 5) -> List[Dict]:
     """
     Parse chunks using OpenAI LLM based on provided prompts.
+
+    Runs `aparse_with_llm_openai` on a fresh event loop, so it can be called
+    from plain scripts and from worker threads alike.
+    """
+    return asyncio.run(aparse_with_llm_openai(chunks, prompts_path, openai_model, top_k=top_k))
+
+
+# ---------------- OpenAI Batch API ---------------- #
+
+def prepare_openai_batch(chunks: List[Dict], prompts_path: str, openai_model: str, top_k: int = 5, key_prefix: str = "") -> List[Dict]:
+    """
+    Build one OpenAI Batch API request per prompt for a PDF pair.
+
+    Each request gets a custom_id of the form "{key_prefix}|{prompt_id}|{n}", so
+    the requests of many pairs can go into a single batch and be split back out.
+
+    Returns:
+        List[Dict]: {"custom_id", "body", "prompt_id", "run_for", "used_context_indices"}
     """
     with open(prompts_path, "r", encoding="utf-8") as f:
         prompts = json.load(f)
 
+    built = _build_all_messages(chunks, prompts, top_k)
+    requests = []
+
+    for n, (p, (run_for, top_idx, messages)) in enumerate(zip(prompts, built)):
+        requests.append({
+            "custom_id": f"{key_prefix}|{p.get('id')}|{n}",
+            "body": {"model": openai_model, "messages": messages, "temperature": 0.0},
+            "prompt_id": p.get("id"),
+            "run_for": run_for,
+            "used_context_indices": top_idx
+        })
+
+    return requests
+
+
+def run_openai_batch(requests: List[Dict], poll_interval: float = 15.0) -> Dict[str, str]:
+    """
+    Submit chat completion requests as one OpenAI batch and wait for it to finish.
+
+    Args:
+        requests (List[Dict]): Requests from `prepare_openai_batch`.
+        poll_interval (float): Seconds between status checks.
+
+    Returns:
+        Dict[str, str]: Model output content keyed by custom_id. Requests that
+                        failed inside the batch are missing from the dict.
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise EnvironmentError("OPENAI_API_KEY not set in environment.")
+
+    client = _get_client(OpenAI, api_key)
+
+    lines = [
+        json.dumps({
+            "custom_id": r["custom_id"],
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": r["body"]
+        })
+        for r in requests
+    ]
+    batch_file = client.files.create(
+        file=("batch_input.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+
+    if batch.status != "completed":
+        raise RuntimeError(f"OpenAI batch {batch.id} ended with status '{batch.status}'.")
+
+    contents = {}
+    if batch.output_file_id:
+        output = client.files.content(batch.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            body = (item.get("response") or {}).get("body") or {}
+            try:
+                contents[item["custom_id"]] = body["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                continue
+
+    return contents
+
+
+def collect_openai_batch(requests: List[Dict], contents: Dict[str, str]) -> List[Dict]:
+    """
+    Turn batch output back into the result list returned by `parse_with_llm_openai`.
+
+    Raises:
+        RuntimeError: If any of the requests has no output in the batch.
+    """
     results = []
 
-    for p in prompts:
-        run_for = p.get("run_for", "both").lower()
-        relevant_chunks = (
-            [c for c in chunks if c.get("source") == "framework"] if run_for == "framework"
-            else [c for c in chunks if c.get("source") == "spo"] if run_for == "spo"
-            else chunks
-        )
+    for r in requests:
+        content = contents.get(r["custom_id"])
+        if content is None:
+            raise RuntimeError(f"No batch output for request '{r['custom_id']}'.")
 
-        index = build_tfidf_index(relevant_chunks)
-        query = p.get("instruction") or p.get("query") or ""
-        top_idx = retrieve_top_k(query, index, k=top_k)
-        context = assemble_context(relevant_chunks, top_idx)
-
-        system_msg = {
-            "role": "system",
-            "content": (
-                "You are a JSON extraction assistant. Use ONLY the provided CONTEXT to answer. "
-                "Output must be valid JSON and must match the provided schema or example. "
-                "If a field cannot be found in the context, set it to null or an empty string."
-            )
-        }
+        results.append({
+            "prompt_id": r["prompt_id"],
+            "run_for": r["run_for"],
+            "result": _parse_json_content(content),
+            "used_context_indices": r["used_context_indices"],
+            "raw_model_output": content
+        })
 
-        user_content = (
-            f"CONTEXT:\n\n{context}\n\n"
-            f"INSTRUCTION:\n\n{p['instruction']}\n\n"
-            f"OUTPUT_SCHEMA / EXAMPLE:\n\n{json.dumps(p['json_schema'], indent=2)}\n\n"
-            "Return ONLY the JSON (no extra commentary)."
-        )
-        user_msg = {"role": "user", "content": user_content}
+    return results
 
-        resp = call_openai(model=openai_model, messages=[system_msg, user_msg], temperature=0.0)
 
-        try:
-            content = resp.choices[0].message.content
-        except Exception:
-            content = str(resp)
+def parse_with_llm_openai_batch(chunks: List[Dict], prompts_path: str, openai_model: str, top_k: int = 5) -> List[Dict]:
+    """
+    Parse chunks using the OpenAI Batch API instead of real-time calls.
+
+    Same output as `parse_with_llm_openai`, at the Batch API's discounted price,
+    but the call can take minutes (up to the 24h completion window) to return.
+    """
+    requests = prepare_openai_batch(chunks, prompts_path, openai_model, top_k=top_k)
+    contents = run_openai_batch(requests)
+    return collect_openai_batch(requests, contents)
+
+
+# ---------------- Gemini Batch Mode ---------------- #
+
+GEMINI_BATCH_DONE_STATES = ("JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED")
+
+
+def parse_with_llm_gemini_batch(
+    chunks: List[Dict],
+    prompts_path: str,
+    gemini_model: str,
+    top_k: int = 5,
+    poll_interval: float = 15.0
+) -> List[Dict]:
+    """
+    Parse chunks using Gemini Batch Mode with inline requests.
+
+    Same output as `parse_with_llm_gemini`, at the batch price, but the call
+    waits until Gemini has processed the whole job.
+
+    Raises:
+        RuntimeError: If the job does not succeed or a request has no response.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise EnvironmentError("GEMINI_API_KEY not set in environment.")
+
+    client = _get_client(genai.Client, api_key)
+
+    with open(prompts_path, "r", encoding="utf-8") as f:
+        prompts = json.load(f)
+
+    built = _build_all_messages(chunks, prompts, top_k)
+
+    inline_requests = []
+    for _, _, messages in built:
+        user_messages, system_messages = _split_messages(messages)
+        inline_requests.append({
+            "contents": [{"role": "user", "parts": [{"text": t} for t in user_messages]}],
+            "config": {
+                "system_instruction": {"parts": [{"text": t} for t in system_messages]},
+                "temperature": 0.0
+            }
+        })
+
+    job = client.batches.create(model=gemini_model, src=inline_requests)
+
+    while job.state.name not in GEMINI_BATCH_DONE_STATES:
+        time.sleep(poll_interval)
+        job = client.batches.get(name=job.name)
+
+    if job.state.name != "JOB_STATE_SUCCEEDED":
+        raise RuntimeError(f"Gemini batch {job.name} ended with state '{job.state.name}'.")
+
+    # Inline responses come back in the same order as the requests
+    responses = job.dest.inlined_responses or []
+
+    results = []
+
+    for n, (p, (run_for, top_idx, _)) in enumerate(zip(prompts, built)):
+        resp = responses[n] if n < len(responses) else None
+        if resp is None or resp.response is None:
+            raise RuntimeError(f"No batch response for prompt '{p.get('id')}'.")
 
         try:
-            parsed = json.loads(content)
+            content = resp.response.text
         except Exception:
-            m = re.search(r'(\{.*\}|\[.*\])', content, flags=re.S)
-            if m:
-                try:
-                    parsed = json.loads(m.group(1))
-                except Exception:
-                    parsed = {"_raw": content}
-            else:
-                parsed = {"_raw": content}
+            content = str(resp.response)
 
         results.append({
             "prompt_id": p.get("id"),
             "run_for": run_for,
-            "result": parsed,
+            "result": _parse_json_content(content),
             "used_context_indices": top_idx,
             "raw_model_output": content
         })
 
-    return results
\ No newline at end of file
+    return results
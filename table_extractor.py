@@ -5,67 +5,153 @@ table_extractor.py
 import os
 import io
 import time
-import tempfile
+import random
+import asyncio
+import threading
+import multiprocessing
 import pdfplumber
+import pikepdf
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4
 
-from pypdf import PdfReader, PdfWriter
 from unstract.llmwhisperer import LLMWhispererClientV2
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from config import MAIN_FOLDER, WHISPERER_BASE
+from config import MAIN_FOLDER, WHISPERER_BASE, FW_RE, SPO_RE
+from cache import file_digest, cache_get, cache_put
 
 # ---------- Configuration ----------
 ROOT_FOLDER = MAIN_FOLDER
 WHISPERER_BASE = WHISPERER_BASE
 # REMOVED: WHISPERER_API_KEY = os.getenv("LLMWHISPERER_API_KEY")  <-- CAUSES ERROR
+
+# Whisperer jobs allowed in flight at once when processing many companies
+WHISPERER_MAX_CONCURRENCY = 5
+
+# Whisperer status polling: start fast, double each time, never wait longer than the cap
+WHISPER_POLL_FIRST = 0.5
+WHISPER_POLL_MAX = 15.0
+
+# Table settings for strict scans: tables are detected from ruling lines only
+STRICT_TABLE_SETTINGS = {"vertical_strategy": "lines", "horizontal_strategy": "lines"}
+
+# Table detection is CPU-bound pure Python; PDFs with at least this many pages
+# are scanned across a process pool, smaller ones are not worth the start-up cost
+PARALLEL_SCAN_MIN_PAGES = 20
 # -----------------------------------
 
+# One scanner pool for the whole process, shared by every caller (the app scans
+# several pairs at once from worker threads). "spawn" avoids forking a
+# multithreaded process, which can leave children deadlocked.
+_scan_pool = None
+_scan_pool_lock = threading.Lock()
+
+
+def _get_scan_pool():
+    global _scan_pool
+    with _scan_pool_lock:
+        if _scan_pool is None:
+            _scan_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _scan_pool
+
+
 def find_framework_and_spo_pdfs(folder_path):
-    files = os.listdir(folder_path)
     framework = None
     spo = None
+    pdfs = []
 
-    for f in files:
-        lf = f.lower()
-        if lf.endswith(".pdf"):
-            if "framework" in lf and not any(word in lf for word in ["spo", "second", "second-party-opinion"]):
-                framework = os.path.join(folder_path, f)
-            elif any(word in lf for word in ["spo", "spoc", "second", "second-party-opinion"]):
-                spo = os.path.join(folder_path, f)
+    # One directory scan both classifies the PDFs and collects them for the fallback
+    with os.scandir(folder_path) as it:
+        for entry in it:
+            if not (entry.name.lower().endswith(".pdf") and entry.is_file()):
+                continue
+            pdfs.append(entry.path)
+
+            is_spo = SPO_RE.search(entry.name)
+            if FW_RE.search(entry.name) and not is_spo:
+                framework = entry.path
+            elif is_spo:
+                spo = entry.path
 
-    pdfs = [os.path.join(folder_path, f) for f in files if f.lower().endswith(".pdf")]
     if not (framework and spo) and len(pdfs) == 2:
         framework, spo = pdfs[0], pdfs[1]
 
     return framework, spo
 
 
-def get_pages_with_tables_pdfplumber(pdf_path):
+def _scan_page_range(pdf_path, start, end, strict=False):
+    """
+    Return the indices of pages in [start, end) that contain at least one table.
+
+    With strict set, tables are detected from ruling lines only (STRICT_TABLE_SETTINGS).
+    Such a table needs at least two horizontal and two vertical edges, so pages with
+    fewer than 4 edges (plain prose) are skipped without running find_tables().
+    Otherwise every page goes through find_tables() with pdfplumber's defaults.
+    """
     pages_with_tables = []
     with pdfplumber.open(pdf_path) as pdf:
-        for i, page in enumerate(pdf.pages):
-            tables = page.find_tables()
+        for i in range(start, end):
+            page = pdf.pages[i]
+            if strict:
+                if len(page.edges) < 4:
+                    continue
+                tables = page.find_tables(table_settings=STRICT_TABLE_SETTINGS)
+            else:
+                tables = page.find_tables()
             if tables and len(tables) > 0:
                 pages_with_tables.append(i)
     return pages_with_tables
 
 
-def assemble_pages_with_pypdf(src_pdf_path, page_indices, writer=None):
-    reader = PdfReader(src_pdf_path)
+def get_pages_with_tables_pdfplumber(pdf_path, strict=False):
+    # Table detection is the slow part of the table pre-scan; cache it by PDF content.
+    # strict only detects line-ruled tables, so its result is cached separately.
+    key = file_digest(pdf_path, extra=f"strict={strict}")
+    cached = cache_get("table_pages", key)
+    if cached is not None:
+        return cached
+
+    with pikepdf.open(pdf_path) as pdf:
+        n_pages = len(pdf.pages)
+    workers = min(os.cpu_count() or 1, n_pages)
+
+    if n_pages < PARALLEL_SCAN_MIN_PAGES or workers < 2:
+        pages_with_tables = _scan_page_range(pdf_path, 0, n_pages, strict)
+    else:
+        # Equal page ranges per worker; each worker opens the PDF from its path
+        step = -(-n_pages // workers)
+        starts = list(range(0, n_pages, step))
+        ends = [min(s + step, n_pages) for s in starts]
+        ranges = _get_scan_pool().map(_scan_page_range, [pdf_path] * len(starts), starts, ends, [strict] * len(starts))
+        pages_with_tables = sorted(i for r in ranges for i in r)
+
+    cache_put("table_pages", key, pages_with_tables)
+    return pages_with_tables
+
+
+def assemble_pages_with_pikepdf(src_pdf, page_indices, writer=None):
+    # Pages are grafted by qpdf without re-parsing their content streams.
+    # src_pdf is an open pikepdf.Pdf and must stay open until writer is saved.
     if writer is None:
-        writer = PdfWriter()
+        writer = pikepdf.Pdf.new()
     for idx in page_indices:
-        if 0 <= idx < len(reader.pages):
-            writer.add_page(reader.pages[idx])
+        if 0 <= idx < len(src_pdf.pages):
+            writer.pages.append(src_pdf.pages[idx])
     return writer
 
 
+@lru_cache(maxsize=8)
 def create_label_page_bytes(text):
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import A4
-
+    # Only a couple of distinct labels exist, so each is rendered once per process
     buffer = io.BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
@@ -77,68 +163,165 @@ def create_label_page_bytes(text):
     return buffer.read()
 
 
-def write_temp_merged_pdf(framework_pdf, spo_pdf, tmp_suffix=".pdf"):
+def build_merged_pdf_bytes(framework_pdf, spo_pdf):
     fw_pages = get_pages_with_tables_pdfplumber(framework_pdf) if framework_pdf else []
     spo_pages = get_pages_with_tables_pdfplumber(spo_pdf) if spo_pdf else []
 
     print(f"  -> Framework pages with tables: {fw_pages}")
     print(f"  -> SPO pages with tables: {spo_pages}")
 
-    writer = PdfWriter()
+    # Source PDFs are kept open (via the ExitStack) until the merged PDF is saved
+    with pikepdf.Pdf.new() as writer, ExitStack() as sources:
+        if fw_pages:
+            label_bytes = create_label_page_bytes("Framework PDF")
+            label_pdf = sources.enter_context(pikepdf.open(io.BytesIO(label_bytes)))
+            writer.pages.append(label_pdf.pages[0])
+            fw_pdf = sources.enter_context(pikepdf.open(framework_pdf))
+            writer = assemble_pages_with_pikepdf(fw_pdf, fw_pages, writer=writer)
 
-    if fw_pages:
-        label_bytes = create_label_page_bytes("Framework PDF")
-        label_reader = PdfReader(io.BytesIO(label_bytes))
-        writer.add_page(label_reader.pages[0])
-        writer = assemble_pages_with_pypdf(framework_pdf, fw_pages, writer=writer)
+        if spo_pages:
+            label_bytes = create_label_page_bytes("Second Party Opinion / SPO")
+            label_pdf = sources.enter_context(pikepdf.open(io.BytesIO(label_bytes)))
+            writer.pages.append(label_pdf.pages[0])
+            spo_pdf_doc = sources.enter_context(pikepdf.open(spo_pdf))
+            writer = assemble_pages_with_pikepdf(spo_pdf_doc, spo_pages, writer=writer)
 
-    if spo_pages:
-        label_bytes = create_label_page_bytes("Second Party Opinion / SPO")
-        label_reader = PdfReader(io.BytesIO(label_bytes))
-        writer.add_page(label_reader.pages[0])
-        writer = assemble_pages_with_pypdf(spo_pdf, spo_pages, writer=writer)
+        if len(writer.pages) == 0:
+            print("    No pages added to merged PDF (no tables).")
+            return None
 
-    if len(writer.pages) == 0:
-        print("    No pages added to merged PDF (no tables).")
-        return None
+        # Kept in memory and streamed to the Whisperer, no temporary file needed
+        buffer = io.BytesIO()
+        writer.save(buffer, linearize=False)
 
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=tmp_suffix)
-    tmp_path = tmp.name
-    try:
-        with open(tmp_path, "wb") as f:
-            writer.write(f)
-    finally:
-        tmp.close()
+    print(f"    Merged PDF built in memory ({buffer.getbuffer().nbytes} bytes)")
+    return buffer.getvalue()
 
-    print(f"    Temporary merged PDF written to: {tmp_path}")
-    return tmp_path
 
-
-def call_whisperer_and_get_text(merged_pdf_path):
+def get_whisperer_client():
     # FIX: Fetch API Key right here, right now
     api_key = os.getenv("LLMWHISPERER_API_KEY")
     
     if not api_key:
         raise ValueError("LLMWHISPERER_API_KEY is missing. Please enter it in the sidebar.")
 
-    client = LLMWhispererClientV2(base_url=WHISPERER_BASE, api_key=api_key)
-    
+    return LLMWhispererClientV2(base_url=WHISPERER_BASE, api_key=api_key)
+
+
+def submit_whisper(client, pdf_bytes):
+    """
+    Start a Whisperer job for the PDF bytes and return its whisper_hash without waiting.
+    """
     result = client.whisper(
-        file_path=merged_pdf_path,
+        stream=io.BytesIO(pdf_bytes),
         mode="low_cost",
         output_mode="layout_preserving"
     )
     whisper_hash = result.get("whisper_hash")
     if not whisper_hash:
         raise RuntimeError("Whisperer did not return a whisper_hash.")
+    return whisper_hash
+
 
+def _check_whisper(client, whisper_hash):
+    """
+    Return the extracted text if the job is done, None if it is still processing.
+    """
+    status = client.whisper_status(whisper_hash=whisper_hash)
+    if status.get("status") == "processed":
+        retrieved = client.whisper_retrieve(whisper_hash=whisper_hash)
+        return retrieved["extraction"]["result_text"]
+    elif status.get("status") == "processing_failed":
+         raise RuntimeError("LLMWhisperer processing failed on server side.")
+    return None
+
+
+def _poll_delays():
+    """
+    Yield exponentially growing waits between status checks, with up to 10% jitter.
+
+    Short jobs are picked up within a second; long jobs are checked at most
+    every WHISPER_POLL_MAX seconds.
+    """
+    delay = WHISPER_POLL_FIRST
     while True:
-        status = client.whisper_status(whisper_hash=whisper_hash)
-        if status.get("status") == "processed":
-            retrieved = client.whisper_retrieve(whisper_hash=whisper_hash)
-            break
-        elif status.get("status") == "processing_failed":
-             raise RuntimeError("LLMWhisperer processing failed on server side.")
-        time.sleep(5)
-
-    return retrieved["extraction"]["result_text"]
\ No newline at end of file
+        yield delay + random.uniform(0, delay * 0.1)
+        delay = min(delay * 2, WHISPER_POLL_MAX)
+
+
+async def await_whisper(client, whisper_hash):
+    """
+    Async counterpart of the polling loop in `call_whisperer_and_get_text`.
+    """
+    for delay in _poll_delays():
+        text = await asyncio.to_thread(_check_whisper, client, whisper_hash)
+        if text is not None:
+            return text
+        await asyncio.sleep(delay)
+
+
+def call_whisperer_and_get_text(pdf_bytes):
+    client = get_whisperer_client()
+    whisper_hash = submit_whisper(client, pdf_bytes)
+
+    for delay in _poll_delays():
+        text = _check_whisper(client, whisper_hash)
+        if text is not None:
+            return text
+        time.sleep(delay)
+
+
+async def _whisper_all(jobs):
+    """
+    Run the Whisperer for every (company, merged PDF bytes) job concurrently.
+
+    Returns the extracted text (or the raised exception) per job, in job order.
+    """
+    client = get_whisperer_client()
+    semaphore = asyncio.Semaphore(WHISPERER_MAX_CONCURRENCY)
+
+    async def run(pdf_bytes):
+        async with semaphore:
+            whisper_hash = await asyncio.to_thread(submit_whisper, client, pdf_bytes)
+            return await await_whisper(client, whisper_hash)
+
+    return await asyncio.gather(*(run(pdf_bytes) for _, pdf_bytes in jobs), return_exceptions=True)
+
+
+def process_subfolders_in_memory(root_folder=ROOT_FOLDER):
+    """
+    Extract the table text of every company subfolder in root_folder.
+
+    The merged table PDFs are built first, then all Whisperer jobs run
+    concurrently so companies overlap their Whisperer turnaround.
+
+    Yields:
+        Tuple[str, str]: (company, extracted table text) per company with tables.
+    """
+    jobs = []
+    with os.scandir(root_folder) as it:
+        # DirEntry.is_dir() usually answers from the directory listing, without a stat per entry
+        subfolders = sorted((e for e in it if e.is_dir()), key=lambda e: e.name)
+
+    for entry in subfolders:
+        sub, subp = entry.name, entry.path
+        print(f"Processing folder: {subp}")
+        framework, spo = find_framework_and_spo_pdfs(subp)
+        if not framework and not spo:
+            print(f"  Skipping {sub}: no framework or SPO PDF found.")
+            continue
+
+        merged_pdf = build_merged_pdf_bytes(framework, spo)
+        if merged_pdf:
+            jobs.append((sub, merged_pdf))
+
+    if not jobs:
+        return
+
+    texts = asyncio.run(_whisper_all(jobs))
+
+    for (company, _), text in zip(jobs, texts):
+        if isinstance(text, Exception):
+            print(f"❌ Whisperer failed for {company}: {text}")
+            continue
+        yield company, text
\ No newline at end of file
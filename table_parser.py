@@ -4,71 +4,235 @@ table_parser.py
 
 import os
 import json
-import re
-from openai import OpenAI
+import asyncio
+from functools import lru_cache
+from typing import List, Tuple
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 
 from config import OPENAI_MODEL, PROMPTS_TABLE
+from json_utils import extract_json_span
+from openai_clients import async_openai_client
+from cache import text_digest, cache_get, cache_put
 
 load_dotenv()
 
 # ---------- Configuration ----------
-# REMOVED: LLM_API_KEY = os.getenv("OPENAI_API_KEY") <-- CAUSES ERROR
 MODEL_NAME = OPENAI_MODEL
+TABLE_MAX_CONCURRENCY = 8  # Table parsing requests in flight at once in parse_tables_async
+TABLE_BATCH_MAX_DOCS = 5  # Documents packed into one request by parse_tables_batched
+TABLE_BATCH_MAX_CHARS = 60000  # Extracted text per packed request, keeps it well inside the context window
+LARGE_OUTPUT_CHARS = 64000  # Async parsing moves model outputs longer than this off the event loop
+TABLE_MAX_RETRIES = 3  # Retries per request on 429/5xx/connection errors, with exponential backoff
+JSON_MODE_ONLY_MODELS = ("gpt-4-turbo", "gpt-3.5-turbo")  # Model prefixes with JSON mode but no structured outputs
+JSON_FIX_PROMPT = "Your previous output was not valid JSON. Return ONLY valid JSON strictly following the schema."
 # -----------------------------------
 
-def parser_for_table(extracted_text: str, prompt_json_path: str) -> dict:
+def _get_api_key() -> str:
     # FIX: Fetch API Key right here
     api_key = os.getenv("OPENAI_API_KEY")
     
     if not api_key:
         raise ValueError("OPENAI_API_KEY is missing. Please enter it in the sidebar.")
 
-    client = OpenAI(api_key=api_key)
-    
-    # Load extraction instructions from JSON
+    return api_key
+
+
+@lru_cache(maxsize=4)
+def _get_client(api_key: str) -> OpenAI:
+    # One client per API key, so its connection pool is reused across calls.
+    # The client itself retries transient errors with exponential backoff and jitter.
+    return OpenAI(api_key=api_key, max_retries=TABLE_MAX_RETRIES)
+
+
+def _new_async_client(api_key: str) -> AsyncOpenAI:
+    return async_openai_client(api_key, max_retries=TABLE_MAX_RETRIES)
+
+
+def _schema_from_example(example) -> dict:
+    """
+    Turn the example output structure from the prompt file into a strict JSON schema:
+    every object key is required and no other keys are allowed, lists take the
+    shape of their first element, and placeholder values become strings.
+    """
+    if isinstance(example, dict):
+        return {
+            "type": "object",
+            "properties": {k: _schema_from_example(v) for k, v in example.items()},
+            "required": list(example),
+            "additionalProperties": False
+        }
+    if isinstance(example, list):
+        return {"type": "array", "items": _schema_from_example(example[0]) if example else {"type": "string"}}
+    if isinstance(example, bool):
+        return {"type": "boolean"}
+    if isinstance(example, (int, float)):
+        return {"type": "number"}
+    return {"type": "string"}
+
+
+@lru_cache(maxsize=8)
+def _read_prompt_file(prompt_json_path: str, mtime: float) -> Tuple[str, str, dict]:
+    """
+    Returns the instruction, the serialized example output and its strict JSON schema.
+    """
+    # Cached per file version (mtime is part of the key), so edits are still picked up
     with open(prompt_json_path, "r", encoding="utf-8") as f:
         prompt_data = json.load(f)
 
     instruction = prompt_data.get("task_description", "")
     json_schema = prompt_data.get("output_json_structure", {})
+    # Compact separators: same structure for the model, fewer input tokens than indent=2
+    schema_str = json.dumps(json_schema, separators=(",", ":"))
+    return instruction, schema_str, _schema_from_example(json_schema)
 
-    safe_text = extracted_text.replace("{", "{{").replace("}", "}}")
 
-    prompt = f"""
-You are an expert financial analyst specializing in sustainable finance documentation.
+# The system message holds everything static (instruction + schema) and the user
+# message only the extracted text, so every request shares the same prompt prefix
+# and OpenAI's automatic prompt caching can reuse it across companies.
+@lru_cache(maxsize=8)
+def _load_prompt(prompt_json_path: str, mtime: float) -> Tuple[str, dict]:
+    """
+    Returns the static system prompt and the response_format.
+    """
+    instruction, schema_str, strict_schema = _read_prompt_file(prompt_json_path, mtime)
+
+    system_prompt = f"""You are an expert financial analyst specializing in sustainable finance documentation.
 
 {instruction}
 
-Analyze the following text extracted from framework and SPO:
----
-{safe_text}
----
+The user message is text extracted from a framework and its SPO.
 
 Return ONLY valid JSON, strictly following this schema:
-{json.dumps(json_schema, indent=2)}
+{schema_str}
 
 Important: Output only the JSON object, without any markdown or explanations.
 """
 
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.0,
-    )
+    # Structured outputs: the model can only emit JSON matching this schema
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {"name": "table_extraction", "schema": strict_schema, "strict": True}
+    }
+    return system_prompt, response_format
+
+
+@lru_cache(maxsize=8)
+def _load_batch_prompt(prompt_json_path: str, mtime: float) -> Tuple[str, dict]:
+    """
+    Same as `_load_prompt`, for several documents packed into one user message.
+    """
+    instruction, schema_str, strict_schema = _read_prompt_file(prompt_json_path, mtime)
 
+    system_prompt = f"""You are an expert financial analyst specializing in sustainable finance documentation.
+
+{instruction}
+
+The user message holds several documents, each marked "=== DOC n ===". Each document is text
+extracted from a framework and its SPO. Process each document independently.
+
+Return ONLY valid JSON: an object whose "results" list has exactly one entry per document, in order,
+each strictly following this schema:
+{schema_str}
+
+Important: Output only the JSON object, without any markdown or explanations.
+"""
+
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "table_extraction_batch",
+            "schema": {
+                "type": "object",
+                "properties": {"results": {"type": "array", "items": strict_schema}},
+                "required": ["results"],
+                "additionalProperties": False
+            },
+            "strict": True
+        }
+    }
+    return system_prompt, response_format
+
+
+def _response_format_for(openai_model: str, response_format: dict) -> dict:
+    """
+    Structured outputs (json_schema) need a recent model; older ones such as
+    gpt-4-turbo reject it with a 400, so they get plain JSON mode instead.
+    """
+    if openai_model.startswith(JSON_MODE_ONLY_MODELS):
+        return {"type": "json_object"}
+    return response_format
+
+
+def _build_table_request(extracted_text: str, prompt_json_path: str, openai_model: str) -> dict:
+    """
+    Keyword arguments for chat.completions.create, shared by the sync and async parsers.
+    """
+    system_prompt, response_format = _load_prompt(prompt_json_path, os.path.getmtime(prompt_json_path))
+
+    # The text is sent as-is and never passed through str.format, so braces need no escaping
+    return {
+        "model": openai_model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": extracted_text},
+        ],
+        "temperature": 0.0,
+        "response_format": _response_format_for(openai_model, response_format),
+    }
+
+
+def _json_fix_request(request: dict, content: str) -> dict:
+    """
+    The same request followed by the unparseable answer and a request to fix it.
+    The system prompt and text stay first, so the retry still hits the prompt cache.
+    """
+    return {
+        **request,
+        "messages": request["messages"] + [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": JSON_FIX_PROMPT},
+        ],
+    }
+
+
+def _table_cache_key(extracted_text: str, prompt_json_path: str, openai_model: str) -> str:
+    """
+    Cache key for one parsed table text: the model, the static prompt (so a new
+    prompt version misses) and the extracted text itself.
+    """
+    system_prompt, _ = _load_prompt(prompt_json_path, os.path.getmtime(prompt_json_path))
+    return text_digest([openai_model, system_prompt, extracted_text])
+
+
+def _cache_table_result(key: str, parsed: dict) -> dict:
+    # Only successful parses are cached; raw fallbacks are retried on the next run
+    if "_raw" not in parsed:
+        cache_put("table_results", key, parsed)
+    return parsed
+
+
+def _response_content(response) -> str:
     try:
-        content = response.choices[0].message.content
+        message = response.choices[0].message
+        # Structured outputs leave content empty when the model refuses
+        return message.content if message.content is not None else (getattr(message, "refusal", None) or "")
     except Exception:
-        content = str(response)
+        return str(response)
 
+
+def _parse_table_content(content: str) -> dict:
     try:
+        # Output that doesn't end like JSON can't parse as a whole; go straight to salvaging
+        if not content.rstrip().endswith(("}", "]")):
+            raise json.JSONDecodeError("Output does not end with } or ]", content, len(content))
         parsed = json.loads(content)
     except json.JSONDecodeError:
-        m = re.search(r'(\{.*\}|\[.*\])', content, flags=re.S)
-        if m:
+        # Linear, string-aware bracket scan instead of a backtracking regex
+        span = extract_json_span(content)
+        if span is not None:
             try:
-                parsed = json.loads(m.group(1))
+                parsed = json.loads(span)
             except Exception:
                 parsed = {"_raw": content}
         else:
@@ -77,4 +241,171 @@ Important: Output only the JSON object, without any markdown or explanations.
     if not isinstance(parsed, dict):
         parsed = {"_parsed": parsed}
 
-    return parsed
\ No newline at end of file
+    return parsed
+
+
+def _parse_table_response(response) -> dict:
+    return _parse_table_content(_response_content(response))
+
+
+async def _aparse_table_response(response) -> dict:
+    # Parsing is CPU-bound; for very large outputs run it in a thread so other
+    # concurrent table requests keep making progress on the event loop
+    content = _response_content(response)
+    if len(content) > LARGE_OUTPUT_CHARS:
+        return await asyncio.to_thread(_parse_table_content, content)
+    return _parse_table_content(content)
+
+
+def parser_for_table(extracted_text: str, prompt_json_path: str, openai_model: str = MODEL_NAME) -> dict:
+    # Reruns on the same text, prompt and model are served from the on-disk cache
+    key = _table_cache_key(extracted_text, prompt_json_path, openai_model)
+    cached = cache_get("table_results", key)
+    if cached is not None:
+        return cached
+
+    client = _get_client(_get_api_key())
+    request = _build_table_request(extracted_text, prompt_json_path, openai_model)
+
+    response = client.chat.completions.create(**request)
+    parsed = _parse_table_response(response)
+
+    # Output that still doesn't parse (truncated, refused) gets one retry with feedback
+    if "_raw" in parsed:
+        print("Table output was not valid JSON; asking the model to fix it.")
+        response = client.chat.completions.create(**_json_fix_request(request, parsed["_raw"]))
+        parsed = _parse_table_response(response)
+
+    return _cache_table_result(key, parsed)
+
+
+def _batch_texts(texts: List[str]) -> List[List[int]]:
+    """
+    Group text indices into batches within TABLE_BATCH_MAX_DOCS and TABLE_BATCH_MAX_CHARS.
+    A text longer than the character cap gets a batch of its own.
+    """
+    batches, current, size = [], [], 0
+    for i, text in enumerate(texts):
+        if current and (len(current) == TABLE_BATCH_MAX_DOCS or size + len(text) > TABLE_BATCH_MAX_CHARS):
+            batches.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_tables_batched(texts: List[str], prompt_json_path: str, openai_model: str = MODEL_NAME) -> List[dict]:
+    """
+    Parse several extracted table texts with as few requests as possible.
+
+    Small texts are packed into one chat completion whose structured output
+    holds one result per text. This saves requests against the rate limit and
+    sends the shared instruction once. A batch whose response doesn't have
+    exactly one result per text is redone one text at a time.
+
+    Returns:
+        List[dict]: Parsed dict per text, in text order.
+    """
+    client = _get_client(_get_api_key())
+    results = [None] * len(texts)
+
+    # Texts already parsed on an earlier run come from the cache; only the rest are batched
+    keys = [_table_cache_key(text, prompt_json_path, openai_model) for text in texts]
+    for i, key in enumerate(keys):
+        results[i] = cache_get("table_results", key)
+    pending = [i for i, parsed in enumerate(results) if parsed is None]
+
+    for batch in _batch_texts([texts[i] for i in pending]):
+        batch = [pending[b] for b in batch]
+        if len(batch) == 1:
+            results[batch[0]] = parser_for_table(texts[batch[0]], prompt_json_path, openai_model)
+            continue
+
+        system_prompt, response_format = _load_batch_prompt(
+            prompt_json_path, os.path.getmtime(prompt_json_path)
+        )
+        docs = "".join(f"=== DOC {n} ===\n{texts[i]}\n\n" for n, i in enumerate(batch, start=1))
+        docs += f"=== END ({len(batch)} documents) ==="
+
+        response = client.chat.completions.create(
+            model=openai_model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": docs},
+            ],
+            temperature=0.0,
+            response_format=_response_format_for(openai_model, response_format),
+        )
+        batch_results = _parse_table_response(response).get("results")
+
+        if isinstance(batch_results, list) and len(batch_results) == len(batch):
+            for i, parsed in zip(batch, batch_results):
+                parsed = parsed if isinstance(parsed, dict) else {"_parsed": parsed}
+                results[i] = _cache_table_result(keys[i], parsed)
+        else:
+            print(f"Batched table response did not match {len(batch)} documents; parsing them one by one.")
+            for i in batch:
+                results[i] = parser_for_table(texts[i], prompt_json_path, openai_model)
+
+    return results
+
+
+async def aparser_for_table(
+    extracted_text: str,
+    prompt_json_path: str,
+    openai_model: str = MODEL_NAME,
+    client: AsyncOpenAI = None
+) -> dict:
+    """
+    Async version of `parser_for_table`. Pass a shared AsyncOpenAI client when
+    parsing many texts; otherwise a client is opened just for this call.
+    """
+    key = _table_cache_key(extracted_text, prompt_json_path, openai_model)
+    cached = cache_get("table_results", key)
+    if cached is not None:
+        return cached
+
+    if client is None:
+        async with _new_async_client(_get_api_key()) as own_client:
+            return await aparser_for_table(extracted_text, prompt_json_path, openai_model, own_client)
+
+    request = _build_table_request(extracted_text, prompt_json_path, openai_model)
+
+    response = await client.chat.completions.create(**request)
+    parsed = await _aparse_table_response(response)
+
+    if "_raw" in parsed:
+        print("Table output was not valid JSON; asking the model to fix it.")
+        response = await client.chat.completions.create(**_json_fix_request(request, parsed["_raw"]))
+        parsed = await _aparse_table_response(response)
+
+    return _cache_table_result(key, parsed)
+
+
+async def parse_tables_async(
+    items: List[Tuple[str, str]],
+    openai_model: str = MODEL_NAME,
+    max_concurrency: int = TABLE_MAX_CONCURRENCY
+) -> list:
+    """
+    Parse many extracted table texts concurrently on one AsyncOpenAI client.
+
+    Args:
+        items: (extracted_text, prompt_json_path) pairs.
+        openai_model: OpenAI model name.
+        max_concurrency: Maximum number of requests in flight at once.
+
+    Returns:
+        list: Parsed dict per item, in item order. An item whose request failed
+              gets the raised exception instead, so one failure doesn't lose the rest.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async with _new_async_client(_get_api_key()) as client:
+        async def one(extracted_text, prompt_json_path):
+            async with semaphore:
+                return await aparser_for_table(extracted_text, prompt_json_path, openai_model, client)
+
+        return await asyncio.gather(*[one(t, p) for t, p in items], return_exceptions=True)
\ No newline at end of file
@@ -1,145 +1,6 @@
 """
 table_writer.py
 
-Writes structured table extraction results from JSON into an Excel file.
-- Creates or ensures existence of two sheets:
-  1. 'Eligibility+EU Tax' — detailed criteria per Use of Proceeds
-  2. 'SDG' — summary of SDGs per Use of Proceeds
-- Handles appending to existing sheets safely, avoiding overwrite issues.
-"""
-
-# import pandas as pd
-# import os
-# from openpyxl import load_workbook
-
-# def writer_to_excel_table(answer: dict, EXCEL_FILE: str):
-#     """
-#     Writes structured data from a parsed JSON (`answer`) into an Excel file.
-
-#     Args:
-#         answer (dict): JSON output containing 'Use_of_Proceeds', SDGs, and Eligibility Criteria.
-#         EXCEL_FILE (str): Path to the Excel file where data should be written.
-
-#     Behavior:
-#         - Creates the Excel file if it does not exist.
-#         - Ensures sheets 'Eligibility+EU Tax' and 'SDG' exist.
-#         - Appends new data to the sheets without overwriting existing rows.
-#         - Automatically generates a new Framework ID (F001, F002, ...).
-#     """
-
-#     sheet_elig = "Eligibility+EU Tax"
-#     sheet_sdg = "SDG"
-    
-#     eligibility_headers = [
-#     "Framework ID",
-#     "Use of Proceeds",
-#     "Eligiblity Criteria",
-#     "SPO Evaluation",
-#     "EU Taxonomy Alignment",
-#     "DNSH",
-#     "Minimum Safeguards",
-#     "EU Taxonomy and Economic Activities"
-#     ]
-
-#     sdg_headers = [
-#     "Framework ID",
-#     "Use of Proceeds",
-#     "SDG"
-#     ]
-
-#     # --- Ensure Excel file exists and if not then create it with the relevant columns ---
-#     if not os.path.exists(EXCEL_FILE):
-        
-#         df_eligibility = pd.DataFrame(columns=eligibility_headers)
-#         df_sdg = pd.DataFrame(columns=sdg_headers)
-        
-#         # Create the workbook
-#         with pd.ExcelWriter(EXCEL_FILE, engine="openpyxl") as writer:
-#             df_eligibility.to_excel(writer, sheet_name="Eligiblity+EU Tax", index=False)
-#             df_sdg.to_excel(writer, sheet_name="SDG", index=False)
-
-
-#     # --- Ensure sheets exist ---
-#     wb = load_workbook(EXCEL_FILE)
-    
-#     for sheet_name,headers in [(sheet_elig, eligibility_headers), (sheet_sdg, sdg_headers)]:
-        
-#         if sheet_name not in wb.sheetnames:
-#             ws = wb.create_sheet(sheet_name)
-#             ws.append(headers)
-#         else:
-#             ws = wb[sheet_name]
-#             if all(cell.value is None for cell in ws[1]):
-#                 ws.append(headers)        
-            
-#     wb.save(EXCEL_FILE)
-#     wb.close()
-
-#     # --- Build dataframes from JSON ---
-#     use_of_proceeds = answer.get("Use_of_Proceeds", [])
-#     eligibility_rows = []
-#     sdg_rows = []
-
-#     # Determine next Framework ID
-#     def get_next_framework_id(ws):
-#         if ws.max_row < 2:
-#             return "F001"
-#         last_id = ws.cell(row=ws.max_row, column=1).value
-#         if not last_id or not last_id.startswith("F"):
-#             return "F001"
-#         number = int(last_id[1:])
-#         return f"F{number + 1:03d}"
-
-#     wb = load_workbook(EXCEL_FILE)
-#     ws_elig = wb[sheet_elig]
-#     framework_id = get_next_framework_id(ws_elig)
-#     wb.close()
-
-#     for uop in use_of_proceeds:
-#         name = uop.get("Name", "")
-#         sdgs = uop.get("SDGs", [])
-#         elig_list = uop.get("Eligibility_Criteria", [])
-
-#         # SDG sheet data
-#         sdg_combined = ", ".join(sdgs) if sdgs else ""
-#         sdg_rows.append({
-#             "Framework ID": framework_id,
-#             "Use of Proceeds": name,
-#             "SDG": sdg_combined
-#         })
-
-#         # Eligibility+EU Tax data
-#         for e in elig_list:
-#             eligibility_rows.append({
-#                 "Framework ID": framework_id,
-#                 "Use of Proceeds": name,
-#                 "Eligibility Criteria": e.get("Description", ""),
-#                 "SPO Evaluation": e.get("SPO_Evaluation", ""),
-#                 "EU Taxonomy": e.get("EU_Taxonomy_Alignment", ""),
-#                 "DNSH": e.get("DNSH", ""),
-#                 "Minimum Safeguards": e.get("Minimum_Safeguards", ""),
-#                 "NACE Code": e.get("NACE_Code", ""),
-#                 "EU Taxonomy Economic Activity": e.get("EU_Taxonomy_Economic_Activity", "")
-#             })
-
-#     df_elig = pd.DataFrame(eligibility_rows)
-#     df_sdg = pd.DataFrame(sdg_rows)
-
-#     # --- Append to Excel safely ---
-#     with pd.ExcelWriter(EXCEL_FILE, mode="a", engine="openpyxl", if_sheet_exists="overlay") as writer:
-#         # Eligibility+EU Tax
-#         startrow = pd.read_excel(EXCEL_FILE, sheet_name=sheet_elig).shape[0]
-#         df_elig.to_excel(writer, sheet_name=sheet_elig, index=False, header=False, startrow=startrow)
-
-#         # SDG
-#         startrow = pd.read_excel(EXCEL_FILE, sheet_name=sheet_sdg).shape[0]
-#         df_sdg.to_excel(writer, sheet_name=sheet_sdg, index=False, header=False, startrow=startrow)
-
-#     print(f"✅ Data written successfully to {EXCEL_FILE} (Framework ID: {framework_id})")
-
-"""
-table_writer.py
-
 Writes structured table extraction results from JSON into an Excel file.
 - Initializes workbook with sheets:
   1. 'Eligibility+EU Tax' — detailed eligibility per Use of Proceeds
@@ -150,7 +11,7 @@ Writes structured table extraction results from JSON into an Excel file.
 """
 
 import os
-import pandas as pd
+import json
 from openpyxl import Workbook, load_workbook
 from typing import Dict
 
@@ -158,35 +19,38 @@ from typing import Dict
 # -------------------------------------------------------------------
 # 🧱 STEP 1: Initialize workbook and headers
 # -------------------------------------------------------------------
-def _init_workbook(EXCEL_FILE: str) -> Workbook:
+sheet_elig = "Eligibility+EU Tax"
+sheet_sdg = "SDG"
+
+# Define headers
+eligibility_headers = [
+    "Framework ID",
+    "Use of Proceeds",
+    "Eligibility Criteria",
+    "SPO Evaluation",
+    "EU Taxonomy Alignment",
+    "DNSH",
+    "Minimum Safeguards",
+    "EU Taxonomy and Economic Activities"
+]
+
+sdg_headers = [
+    "Framework ID",
+    "Use of Proceeds",
+    "SDG"
+]
+
+
+def _init_workbook(EXCEL_FILE: str = None, workbook: Workbook = None) -> Workbook:
     """
-    Create the Excel workbook with required sheets and headers if missing.
+    Open (or create) the Excel workbook and ensure the required sheets and headers.
+    Nothing is written to disk here; the caller saves once after appending its rows.
+    If an already open `workbook` is given, the sheets are ensured on it instead.
     Returns:
         openpyxl Workbook object
     """
-    sheet_elig = "Eligibility+EU Tax"
-    sheet_sdg = "SDG"
-
-    # Define headers
-    eligibility_headers = [
-        "Framework ID",
-        "Use of Proceeds",
-        "Eligibility Criteria",
-        "SPO Evaluation",
-        "EU Taxonomy Alignment",
-        "DNSH",
-        "Minimum Safeguards",
-        "EU Taxonomy and Economic Activities"
-    ]
-
-    sdg_headers = [
-        "Framework ID",
-        "Use of Proceeds",
-        "SDG"
-    ]
-
     # --- If file doesn't exist, create new workbook ---
-    if not os.path.exists(EXCEL_FILE):
+    if workbook is None and not os.path.exists(EXCEL_FILE):
         wb = Workbook()
 
         # Sheet 1: Eligibility+EU Tax
@@ -197,12 +61,10 @@ def _init_workbook(EXCEL_FILE: str) -> Workbook:
         # Sheet 2: SDG
         ws2 = wb.create_sheet(sheet_sdg)
         ws2.append(sdg_headers)
-
-        wb.save(EXCEL_FILE)
         return wb
 
-    # --- If file exists, ensure both sheets and headers exist ---
-    wb = load_workbook(EXCEL_FILE)
+    # --- If file exists (or a workbook is open), ensure both sheets and headers exist ---
+    wb = workbook if workbook is not None else load_workbook(EXCEL_FILE)
     for sheet_name, headers in [(sheet_elig, eligibility_headers), (sheet_sdg, sdg_headers)]:
         if sheet_name not in wb.sheetnames:
             ws = wb.create_sheet(sheet_name)
@@ -214,7 +76,6 @@ def _init_workbook(EXCEL_FILE: str) -> Workbook:
             if all(v is None for v in first_row):
                 ws.append(headers)
 
-    wb.save(EXCEL_FILE)
     return wb
 
 
@@ -237,10 +98,20 @@ def _get_next_framework_id(ws) -> str:
     return f"F{number + 1:03d}"
 
 
+def _cell_value(value):
+    """
+    Make a parsed JSON value storable in a cell. openpyxl rejects lists and dicts,
+    which the model sometimes returns for a field, so those are written as JSON text.
+    """
+    if isinstance(value, (list, dict, tuple, set)):
+        return json.dumps(value, ensure_ascii=False, default=list)
+    return value
+
+
 # -------------------------------------------------------------------
 # ✍️ STEP 3: Main writer function
 # -------------------------------------------------------------------
-def writer_to_excel_table(answer: Dict, EXCEL_FILE: str):
+def writer_to_excel_table(answer: Dict, EXCEL_FILE: str = None, workbook: Workbook = None):
     """
     Writes structured data from parsed JSON into an Excel file.
     Automatically appends to existing sheets and generates Framework IDs.
@@ -248,65 +119,42 @@ def writer_to_excel_table(answer: Dict, EXCEL_FILE: str):
     Args:
         answer (dict): JSON containing Use_of_Proceeds, SDGs, and Eligibility Criteria.
         EXCEL_FILE (str): Path to Excel file.
+        workbook (Workbook, optional): Open workbook to append to in memory instead;
+            the caller saves it once at the end of the batch.
     """
-    sheet_elig = "Eligibility+EU Tax"
-    sheet_sdg = "SDG"
-
     # Ensure workbook and headers exist
-    wb = _init_workbook(EXCEL_FILE)
+    wb = _init_workbook(EXCEL_FILE, workbook=workbook)
 
-    # Get worksheet for Eligibility+EU Tax
+    # Get worksheets; the workbook stays open until the rows are appended
     ws_elig = wb[sheet_elig]
+    ws_sdg = wb[sheet_sdg]
     framework_id = _get_next_framework_id(ws_elig)
-    wb.close()
 
-    # Prepare data rows
-    use_of_proceeds = answer.get("Use_of_Proceeds", [])
-    eligibility_rows = []
-    sdg_rows = []
-
-    for uop in use_of_proceeds:
+    # -------------------------------------------------------------------
+    # 📗 Append rows after the current last row (ws.max_row)
+    # -------------------------------------------------------------------
+    # Tuples follow the column order of eligibility_headers / sdg_headers
+    for uop in answer.get("Use_of_Proceeds", []):
         name = uop.get("Name", "")
         sdgs = uop.get("SDGs", [])
-        elig_list = uop.get("Eligibility_Criteria", [])
-
-        # SDG sheet row
-        sdg_combined = ", ".join(sdgs) if sdgs else ""
-        sdg_rows.append({
-            "Framework ID": framework_id,
-            "Use of Proceeds": name,
-            "SDG": sdg_combined
-        })
 
         # Eligibility sheet rows
-        for e in elig_list:
-            eligibility_rows.append({
-                "Framework ID": framework_id,
-                "Use of Proceeds": name,
-                "Eligibility Criteria": e.get("Description", ""),
-                "SPO Evaluation": e.get("SPO_Evaluation", ""),
-                "EU Taxonomy Alignment": e.get("EU_Taxonomy_Alignment", ""),
-                "DNSH": e.get("DNSH", ""),
-                "Minimum Safeguards": e.get("Minimum_Safeguards", ""),
-                "EU Taxonomy and Economic Activities": e.get("EU_Taxonomy_Economic_Activity", "")
-            })
-
-    df_elig = pd.DataFrame(eligibility_rows)
-    df_sdg = pd.DataFrame(sdg_rows)
+        for e in uop.get("Eligibility_Criteria", []):
+            ws_elig.append(tuple(_cell_value(v) for v in (
+                framework_id,
+                name,
+                e.get("Description", ""),
+                e.get("SPO_Evaluation", ""),
+                e.get("EU_Taxonomy_Alignment", ""),
+                e.get("DNSH", ""),
+                e.get("Minimum_Safeguards", ""),
+                e.get("EU_Taxonomy_Economic_Activity", "")
+            )))
 
-    # -------------------------------------------------------------------
-    # 📘 Append to Excel safely using pandas
-    # -------------------------------------------------------------------
-    with pd.ExcelWriter(EXCEL_FILE, mode="a", engine="openpyxl", if_sheet_exists="overlay") as writer:
-        # Eligibility+EU Tax sheet
-        existing_elig = pd.read_excel(EXCEL_FILE, sheet_name=sheet_elig)
-        startrow = len(existing_elig) + 1
-        df_elig.to_excel(writer, sheet_name=sheet_elig, index=False, header=False, startrow=startrow)
-
-        # SDG sheet
-        existing_sdg = pd.read_excel(EXCEL_FILE, sheet_name=sheet_sdg)
-        startrow = len(existing_sdg) + 1
-        df_sdg.to_excel(writer, sheet_name=sheet_sdg, index=False, header=False, startrow=startrow)
-
-    print(f"✅ Data written successfully to '{EXCEL_FILE}' (Framework ID: {framework_id})")
+        # SDG sheet row
+        sdg_text = ", ".join(str(_cell_value(s)) for s in sdgs) if isinstance(sdgs, list) else sdgs
+        ws_sdg.append((framework_id, _cell_value(name), _cell_value(sdg_text or "")))
 
+    if workbook is None:
+        wb.save(EXCEL_FILE)
+    print(f"✅ Data written successfully to {EXCEL_FILE or 'workbook'} (Framework ID: {framework_id})")
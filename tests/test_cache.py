@@ -0,0 +1,57 @@
+import os
+import pickle
+import threading
+
+import cache
+
+
+def _use_tmp_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(cache, "_memory", cache.OrderedDict())
+
+
+def test_put_then_get_round_trips(monkeypatch, tmp_path):
+    _use_tmp_cache(monkeypatch, tmp_path)
+    cache.cache_put("ns", "k", {"a": [1, 2]})
+    cache._memory.clear()
+    assert cache.cache_get("ns", "k") == {"a": [1, 2]}
+
+
+def test_unreadable_entry_is_a_miss_and_removed(monkeypatch, tmp_path):
+    _use_tmp_cache(monkeypatch, tmp_path)
+    os.makedirs(tmp_path / "ns")
+    for key, data in [
+        ("truncated", pickle.dumps({"a": 1})[:5]),
+        ("stale", pickle.dumps(pickle.PickleError("x")).replace(b"PickleError", b"GoneError__")),
+    ]:
+        (tmp_path / "ns" / f"{key}.pkl").write_bytes(data)
+        assert cache.cache_get("ns", key) is None
+        assert not (tmp_path / "ns" / f"{key}.pkl").exists()
+
+
+def test_unwritable_cache_dir_does_not_raise(monkeypatch, tmp_path):
+    _use_tmp_cache(monkeypatch, tmp_path)
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    monkeypatch.setattr(cache, "CACHE_DIR", str(blocker))
+    cache.cache_put("ns", "k", 1)
+    assert cache.cache_get("ns", "k") == 1  # still served from memory
+
+
+def test_concurrent_puts_and_evictions(monkeypatch, tmp_path):
+    _use_tmp_cache(monkeypatch, tmp_path)
+    monkeypatch.setattr(cache, "CACHE_MAX_ENTRIES", 5)
+
+    def worker(n):
+        for i in range(40):
+            cache.cache_put("ns", f"{n}-{i}", i)
+            cache.cache_get("ns", f"{n}-{i // 2}")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(cache._memory) <= 5
+    assert len(os.listdir(tmp_path / "ns")) <= 5 + 8  # in-flight entries may still be evicted later
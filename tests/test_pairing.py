@@ -0,0 +1,108 @@
+import os
+import random
+from difflib import SequenceMatcher
+
+from pairing import match_pairs
+
+
+class FakeUpload:
+    """Stands in for a Streamlit UploadedFile; only `name` is used."""
+
+    def __init__(self, name):
+        self.name = name
+
+
+def _uploads(*names):
+    return [FakeUpload(n) for n in names]
+
+
+def _pair_names(result):
+    pairs, _ = result
+    return [(p["framework"].name, p["spo"].name) for p in pairs]
+
+
+def _reference_pairs(file_list):
+    # The original scan: score every remaining SPO for each framework
+    frameworks, spos = [], []
+    for f in file_list:
+        fname = f.name.lower()
+        is_spo = any(x in fname for x in ["spo", "second", "opinion"])
+        if "framework" in fname and not is_spo:
+            frameworks.append(f)
+        elif is_spo:
+            spos.append(f)
+
+    pairs, used = [], set()
+    for fw in frameworks:
+        best_match, best_score = None, 0.0
+        fw_name = fw.name.lower()
+        for spo in spos:
+            if spo in used:
+                continue
+            spo_name = spo.name.lower()
+            score = SequenceMatcher(None, fw_name, spo_name).ratio()
+            if len(os.path.commonprefix([fw_name, spo_name])) > 3:
+                score += 0.5
+            if score > best_score:
+                best_score, best_match = score, spo
+        if best_match and best_score > 0.4:
+            used.add(best_match)
+            pairs.append((fw.name, best_match.name))
+    return pairs
+
+
+def test_single_spo_in_prefix_bucket_is_not_taken_blindly():
+    # "green_" holds only Acme's SPO and "greens" only Zeta's; Zeta's framework
+    # shares Acme's prefix bucket but is a better match for its own SPO
+    files = _uploads(
+        "Green_Framework_Zeta.pdf",
+        "GreenFramework_Acme.pdf",
+        "Green_SPO_Acme.pdf",
+        "GreenSPO_Zeta.pdf",
+    )
+    assert _pair_names(match_pairs(files)) == [
+        ("Green_Framework_Zeta.pdf", "GreenSPO_Zeta.pdf"),
+        ("GreenFramework_Acme.pdf", "Green_SPO_Acme.pdf"),
+    ]
+
+
+def test_colliding_prefixes_pick_the_closest_spo():
+    files = _uploads(
+        "Energy_Framework_2023.pdf",
+        "Energy_SPO_2021.pdf",
+        "Energy_SPO_2023.pdf",
+        "Tesla_Framework.pdf",
+        "Tesla_SPO.pdf",
+    )
+    assert _pair_names(match_pairs(files)) == [
+        ("Energy_Framework_2023.pdf", "Energy_SPO_2023.pdf"),
+        ("Tesla_Framework.pdf", "Tesla_SPO.pdf"),
+    ]
+
+
+def test_unpaired_files_are_returned():
+    files = _uploads("Tesla_Framework.pdf", "annual_report.pdf", "Tesla_SPO.pdf", "BMW_SPO.pdf")
+    pairs, others = match_pairs(files)
+    assert [(p["framework"].name, p["spo"].name) for p in pairs] == [("Tesla_Framework.pdf", "Tesla_SPO.pdf")]
+    assert sorted(f.name for f in others) == ["BMW_SPO.pdf", "annual_report.pdf"]
+
+
+def test_matches_reference_on_random_filenames():
+    rng = random.Random(1234)
+    companies = ["tesla", "bmw", "engie", "green", "greenco", "acme", "zeta", "enel", "energy", "orsted"]
+    seps = ["_", "-", " ", ""]
+    fw_words = ["Framework", "framework", "Green-Bond-Framework"]
+    spo_words = ["SPO", "spo", "Second-Party-Opinion", "opinion"]
+
+    for _ in range(500):
+        names = []
+        for company in rng.sample(companies, rng.randint(1, 6)):
+            sep = rng.choice(seps)
+            year = rng.choice(["", "_2022", "_2023"])
+            if rng.random() < 0.9:
+                names.append(f"{company}{sep}{rng.choice(fw_words)}{year}.pdf")
+            if rng.random() < 0.9:
+                names.append(f"{company}{rng.choice(seps)}{rng.choice(spo_words)}{year}.pdf")
+        rng.shuffle(names)
+        files = _uploads(*names)
+        assert _pair_names(match_pairs(files)) == _reference_pairs(files), names
@@ -0,0 +1,53 @@
+import json
+
+from openpyxl import Workbook, load_workbook
+
+from table_writer import writer_to_excel_table, sheet_elig, sheet_sdg, eligibility_headers
+
+
+ANSWER = {
+    "Use_of_Proceeds": [
+        {
+            "Name": "Renewable Energy",
+            "SDGs": ["SDG 7", "SDG 13"],
+            "Eligibility_Criteria": [
+                {
+                    "Description": "Solar and wind generation",
+                    "SPO_Evaluation": {"rating": "Aligned", "notes": ["credible", "ambitious"]},
+                    "EU_Taxonomy_Alignment": ["4.1", "4.3"],
+                    "DNSH": "Yes",
+                    "Minimum_Safeguards": None,
+                    "EU_Taxonomy_Economic_Activity": "Electricity generation",
+                }
+            ],
+        }
+    ]
+}
+
+
+def _rows(ws):
+    return [list(r) for r in ws.iter_rows(min_row=2, values_only=True)]
+
+
+def test_nested_values_are_written_as_json():
+    wb = Workbook()
+    writer_to_excel_table(ANSWER, workbook=wb)
+
+    [row] = _rows(wb[sheet_elig])
+    assert row[0] == "F001"
+    assert json.loads(row[eligibility_headers.index("SPO Evaluation")]) == {
+        "rating": "Aligned", "notes": ["credible", "ambitious"]
+    }
+    assert json.loads(row[eligibility_headers.index("EU Taxonomy Alignment")]) == ["4.1", "4.3"]
+    assert row[eligibility_headers.index("DNSH")] == "Yes"
+    assert _rows(wb[sheet_sdg]) == [["F001", "Renewable Energy", "SDG 7, SDG 13"]]
+
+
+def test_appends_to_existing_file_with_next_framework_id(tmp_path):
+    path = str(tmp_path / "out.xlsx")
+    writer_to_excel_table(ANSWER, EXCEL_FILE=path)
+    writer_to_excel_table(ANSWER, EXCEL_FILE=path)
+
+    wb = load_workbook(path)
+    assert [r[0] for r in _rows(wb[sheet_elig])] == ["F001", "F002"]
+    assert [r[0] for r in _rows(wb[sheet_sdg])] == ["F001", "F002"]
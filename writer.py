@@ -6,18 +6,12 @@ import os
 from openpyxl import Workbook, load_workbook
 from typing import Dict
 
-def _init_workbook(file_path: str) -> Workbook:
+def _create_sheets(wb: Workbook) -> None:
     """
-    Initialize the Excel workbook if it does not exist, creating required sheets.
+    Add the Framework Overview, Governance and SPO Summary sheets with headers.
     """
-    if os.path.exists(file_path):
-        return load_workbook(file_path)
-
-    wb = Workbook()
-
     # Sheet 1: Framework Overview
-    ws1 = wb.active
-    ws1.title = "Framework Overview"
+    ws1 = wb.create_sheet("Framework Overview")
     ws1.append([
         "Framework ID", "Issuer", "Framework Name", "SPO Provider", "Alignment",
         "Year", "SPO Date", "Framework Source"
@@ -35,7 +29,26 @@ def _init_workbook(file_path: str) -> Workbook:
         "Framework ID", "Summary"
     ])
 
-    wb.save(file_path)
+
+def _init_workbook(file_path: str = None, workbook: Workbook = None) -> Workbook:
+    """
+    Open the Excel workbook, or create it in memory with the required sheets.
+
+    Nothing is written to disk here; write_to_excel saves once after its rows
+    are added. If an already open `workbook` is given, the sheets are added to
+    it when missing.
+    """
+    if workbook is not None:
+        if "Framework Overview" not in workbook.sheetnames:
+            _create_sheets(workbook)
+        return workbook
+
+    if os.path.exists(file_path):
+        return load_workbook(file_path)
+
+    wb = Workbook()
+    wb.remove(wb.active)
+    _create_sheets(wb)
     return wb
 
 
@@ -50,11 +63,14 @@ def _get_next_framework_id(ws) -> str:
     return f"F{number + 1:03d}"
 
 
-def write_to_excel(json_data: Dict, run_for: str, file_path: str) -> None:
+def write_to_excel(json_data: Dict, run_for: str, file_path: str = None, workbook: Workbook = None) -> None:
     """
     Write extracted JSON data into the Excel workbook at file_path.
+
+    When an open `workbook` is passed instead, rows are added to it in memory
+    and the caller is responsible for saving it once at the end of the batch.
     """
-    wb = _init_workbook(file_path)
+    wb = _init_workbook(file_path, workbook=workbook)
     ws1 = wb["Framework Overview"]
 
     # -------------------------
@@ -116,5 +132,6 @@ def write_to_excel(json_data: Dict, run_for: str, file_path: str) -> None:
             json_data.get("Summary", "")
         ])
 
-    wb.save(file_path)
-    print(f"✅ Data written successfully for {run_for} ({framework_id}) to {file_path}")
\ No newline at end of file
+    if workbook is None:
+        wb.save(file_path)
+    print(f"✅ Data written successfully for {run_for} ({framework_id}) to {file_path or 'workbook'}")
\ No newline at end of file